@@ -1,12 +1,33 @@
+# Start of this script run; Streamlit re-executes the whole file on every interaction
+import time
+SCRIPT_START = time.perf_counter()
+
 import streamlit as st
 import cv2
-import face_recognition as frg
 import yaml
-import pickle
 import numpy as np
 import os
-from collections import defaultdict
-import pandas as pd
+import sys
+import importlib
+import datetime
+import tempfile
+from utils.attendance import AttendanceWriter, record_timeline
+from utils.batch import get_upload_recognizer
+from utils.dataset import build_database
+from utils.detection import get_detector
+from utils.gallery import get_gallery, invalidate_gallery, update_gallery
+from utils.liveview import OverlayCache, get_stream
+from utils.metrics import metrics, start_exporter
+from utils.motion import MotionGate
+from utils.multicam import MultiCameraRecognizer, parse_sources
+from utils.pipeline import WebcamPipeline
+from utils.quality import get_quality_gate
+from utils.roster import get_roster
+from utils.search import search_config
+from utils.store import migrate_pickle, open_store
+from utils.tracking import FaceTracker, iou
+from utils.video import process_video
+from utils.voting import VoteAggregator
 
 # Load configuration
 try:
@@ -17,6 +38,7 @@ try:
     WEBCAM_PROMPT = cfg['INFO']['WEBCAM_PROMPT']
 except:
     # Default configuration if config file is not found
+    cfg = {}
     DATASET_DIR = "dataset/"
     PKL_PATH = "dataset/database.pkl"
     PICTURE_PROMPT = "Upload an image to recognize faces"
@@ -41,52 +63,294 @@ except:
     if not os.path.exists(DATASET_DIR):
         os.makedirs(DATASET_DIR)
 
-# Initialize information dictionary
-information = defaultdict(dict)
+# Gallery search backend: 'exact' brute force (optionally over float16/int8
+# copies re-ranked at full precision) or 'ivf' approximate index
+SEARCH = cfg.get('SEARCH') or {}
+SEARCH_BACKEND, SEARCH_PARAMS = search_config(SEARCH)
+
+# Camera and live pipeline settings
+CAMERA = cfg.get('CAMERA') or {}
+CAMERA_INDEX = CAMERA.get('INDEX', 0)
+CAMERA_WIDTH = CAMERA.get('WIDTH', 640)
+CAMERA_HEIGHT = CAMERA.get('HEIGHT', 480)
+PIPELINE_WORKERS = (cfg.get('PIPELINE') or {}).get('WORKERS', 2)
+
+# Track-then-recognize: full detection only every DETECT_EVERY frames
+TRACKING = cfg.get('TRACKING') or {}
+TRACKING_ENABLED = TRACKING.get('ENABLED', False)
+TRACKING_PARAMS = {
+    'detect_every': TRACKING.get('DETECT_EVERY', 10),
+    'iou_threshold': TRACKING.get('IOU_THRESHOLD', 0.3),
+    'max_missed': TRACKING.get('MAX_MISSED', 2),
+}
+
+# Detection runs on a downscaled frame; boxes are mapped back to full resolution
+DETECTION = cfg.get('DETECTION') or {}
+DETECTION_PARAMS = {
+    'scale': DETECTION.get('SCALE', 1.0),
+    'upsample': DETECTION.get('UPSAMPLE', 1),
+    'model': DETECTION.get('MODEL', 'hog'),
+    'min_face_size': DETECTION.get('MIN_FACE_SIZE', 0),
+}
+detector = get_detector(
+    **DETECTION_PARAMS,
+    adaptive=DETECTION.get('ADAPTIVE', False),
+    frame_budget_ms=DETECTION.get('FRAME_BUDGET_MS', 150),
+    min_scale=DETECTION.get('MIN_SCALE', 0.25),
+)
+
+# Motion gate: recognize only frames (and regions) where something moved
+MOTION = cfg.get('MOTION') or {}
+MOTION_ENABLED = MOTION.get('ENABLED', False)
+MOTION_PARAMS = {
+    'method': MOTION.get('METHOD', 'diff'),
+    'width': MOTION.get('WIDTH', 160),
+    'threshold': MOTION.get('THRESHOLD', 25),
+    'min_area': MOTION.get('MIN_AREA', 0.002),
+    'full_frame_area': MOTION.get('FULL_FRAME_AREA', 0.3),
+    'max_idle': MOTION.get('MAX_IDLE', 30.0),
+}
+
+# Quality gate between detection and encoding: skip tiny, blurred, dark or profile faces
+QUALITY = cfg.get('QUALITY') or {}
+QUALITY_PARAMS = None
+quality_gate = None
+if QUALITY.get('ENABLED', False):
+    QUALITY_PARAMS = {
+        'min_size': QUALITY.get('MIN_SIZE', 40),
+        'min_sharpness': QUALITY.get('MIN_SHARPNESS', 40.0),
+        'min_brightness': QUALITY.get('MIN_BRIGHTNESS', 40.0),
+        'max_brightness': QUALITY.get('MAX_BRIGHTNESS', 230.0),
+        'max_yaw': QUALITY.get('MAX_YAW', 0.5),
+    }
+    quality_gate = get_quality_gate(**QUALITY_PARAMS)
+
+# Several classroom cameras, one recognition process per source
+MULTICAM = cfg.get('MULTICAM') or {}
+MULTICAM_SOURCES = parse_sources(MULTICAM.get('SOURCES'))
+MULTICAM_FRAME_STEP = MULTICAM.get('FRAME_STEP', 1)
+AUTO_MARK = (cfg.get('RECOGNITION') or {}).get('AUTO_MARK', True)
+
+# Live attendance: a student is marked once MIN_VOTES of the last VOTE_WINDOW detection frames encoded them
+VOTE_WINDOW = (cfg.get('RECOGNITION') or {}).get('VOTE_WINDOW', 10)
+MIN_VOTES = (cfg.get('RECOGNITION') or {}).get('MIN_VOTES', 5)
+
+# Recorded lectures: sample changed frames and recognize them in a process pool
+VIDEO = cfg.get('VIDEO') or {}
+VIDEO_PARAMS = {
+    'workers': VIDEO.get('WORKERS'),
+    'check_interval': VIDEO.get('CHECK_INTERVAL', 0.2),
+    'diff_threshold': VIDEO.get('DIFF_THRESHOLD', 8.0),
+    'max_gap': VIDEO.get('MAX_GAP', 5.0),
+}
+
+# Uploaded images: recognized in a process pool, results cached by content hash and tolerance
+UPLOAD = cfg.get('UPLOAD') or {}
+UPLOAD_PARAMS = {
+    'workers': UPLOAD.get('WORKERS'),
+    'cache_size': UPLOAD.get('CACHE_SIZE', 64),
+}
+
+# Live view transport: Streamlit images, or an MJPEG stream served next to the app
+LIVE_VIEW = cfg.get('LIVE_VIEW') or {}
+LIVE_VIEW_MODE = LIVE_VIEW.get('MODE', 'streamlit')
+LIVE_VIEW_URL = LIVE_VIEW.get('URL')
+LIVE_VIEW_PARAMS = {
+    'host': LIVE_VIEW.get('HOST', '127.0.0.1'),
+    'port': LIVE_VIEW.get('PORT', 8502),
+    'quality': LIVE_VIEW.get('JPEG_QUALITY', 70),
+    'width': LIVE_VIEW.get('WIDTH'),
+}
+
+# Stage timings for the sidebar panel and the Prometheus export
+METRICS = cfg.get('METRICS') or {}
+metrics.enabled = METRICS.get('ENABLED', True)
+start_exporter(
+    path=METRICS.get('PROMETHEUS_FILE'),
+    port=METRICS.get('PROMETHEUS_PORT'),
+    interval=METRICS.get('EXPORT_INTERVAL', 15),
+)
+
+# Sidecar cache of per-file encodings used by build_dataset
+ENCODING_CACHE = cfg.get('PATH', {}).get('ENCODING_CACHE', os.path.join(DATASET_DIR, 'encodings_cache.pkl'))
+
+# Enrollment store: memory-mapped embeddings, SQLite metadata, JPEG thumbnails
+STORE_DIR = cfg.get('PATH', {}).get('STORE_DIR', os.path.join(DATASET_DIR, 'store'))
+DATABASE_VIEW = cfg.get('DATABASE') or {}
+DATABASE_PAGE_SIZE = DATABASE_VIEW.get('PAGE_SIZE', 50)
+store = open_store(STORE_DIR, thumb_cache_size=DATABASE_VIEW.get('THUMB_CACHE_SIZE', 256))
+
+# One-shot migration of the legacy pickle database
+if not store.migrated and not len(store) and os.path.exists(PKL_PATH):
+    migrate_pickle(PKL_PATH, store)
 
 # Utility Functions
+def lazy_import(name):
+    """Import a heavy module (dlib via face_recognition, pandas) on first use, timing the first import"""
+    module = sys.modules.get(name)
+    if module is None:
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        metrics.observe(f'import_{name}', time.perf_counter() - start)
+    return module
+
 def get_database():
-    """Load the database from the pickle file"""
-    try:
-        with open(PKL_PATH, 'rb') as f:
-            database = pickle.load(f)
-        return database
-    except:
-        # Return empty database if file doesn't exist
-        return {}
-
-def recognize(image, TOLERANCE):
-    """Recognize faces in an image"""
-    database = get_database()
-    if not database:
+    """Load student metadata (index -> ID and name) without images or encodings"""
+    with metrics.timer('get_database'):
+        return store.records()
+
+def load_gallery():
+    """Get the shared gallery of enrolled encodings"""
+    with metrics.timer('load_gallery'):
+        gallery = get_gallery(store.paths, store.gallery_arrays, SEARCH_BACKEND, **SEARCH_PARAMS)
+    metrics.set('gallery_size', len(gallery))
+    if hasattr(gallery.index, 'memory_report'):
+        memory = gallery.index.memory_report()
+        metrics.set('gallery_scanned_bytes', memory['scanned_bytes'])
+        metrics.set('gallery_resident_bytes', memory['resident_bytes'])
+    return gallery
+
+def detect_faces(image):
+    """Find face boxes in an image"""
+    with metrics.timer('detect'):
+        return detector.detect(image)
+
+def check_quality(image, face_locations):
+    """Flag the face boxes worth encoding (all of them if the quality gate is off)"""
+    if quality_gate is None:
+        return [True] * len(face_locations)
+    with metrics.timer('quality'):
+        passed = quality_gate.filter(image, face_locations)
+    metrics.set('quality_skip_rate', round(quality_gate.skip_rate, 3))
+    return passed
+
+def identify_faces(image, face_locations, TOLERANCE):
+    """Encode the given face boxes and match them against the gallery"""
+    gallery = load_gallery()
+    frg = lazy_import('face_recognition')
+    passed = check_quality(image, face_locations)
+    with metrics.timer('encode'):
+        face_encodings = frg.face_encodings(image, [box for box, ok in zip(face_locations, passed) if ok])
+    with metrics.timer('match'):
+        matches = iter(gallery.match(face_encodings, TOLERANCE))
+    
+    identities = []
+    for ok in passed:
+        # Skipped faces stay unknown; a tracker retries them on its next detection
+        if not ok:
+            identities.append(('Unknown', 'Unknown', float('inf')))
+            continue
+        match_index, distance = next(matches)
+        if match_index >= 0:
+            identities.append((gallery.names[match_index], gallery.ids[match_index], distance))
+        else:
+            identities.append(('Unknown', 'Unknown', distance))
+    return identities
+
+def draw_box(image, face):
+    """Draw the box of a (box, name, id, distance) face onto an image"""
+    (top, right, bottom, left) = face[0]
+    cv2.rectangle(image, (left, top), (right, bottom), (0, 255, 0), 2)
+
+def draw_label(image, face):
+    """Draw the name and match distance of a face above its box"""
+    (top, right, bottom, left), name, id, distance = face
+    if id != 'Unknown':
+        cv2.putText(image, str(round(distance, 2)), (left, top-30), cv2.FONT_HERSHEY_SIMPLEX, 0.75, (0, 255, 0), 2)
+    cv2.putText(image, name, (left, top-10), cv2.FONT_HERSHEY_SIMPLEX, 0.75, (0, 255, 0), 2)
+
+def draw_faces(image, faces):
+    """Draw boxes, names and match distances onto an image"""
+    for face in faces:
+        draw_box(image, face)
+        draw_label(image, face)
+
+def detect_in_regions(image, regions):
+    """Find face boxes inside (top, right, bottom, left) regions of an image"""
+    face_locations = []
+    for top, right, bottom, left in regions:
+        crop = np.ascontiguousarray(image[top:bottom, left:right])
+        for t, r, b, l in detect_faces(crop):
+            face_locations.append((t + top, r + left, b + top, l + left))
+    return face_locations
+
+def recognize(image, TOLERANCE, tracker=None, motion=None, overlay=None, voter=None):
+    """Recognize faces in an image, reusing tracked identities if a tracker is given,
+    skipping unchanged frames and regions if a motion gate is given, redrawing
+    only changed labels if an overlay cache is given and voting for attendance
+    if a vote aggregator is given"""
+    gallery = load_gallery()
+    if not len(gallery):
         return image, 'Unknown', 'Unknown'
         
-    known_encoding = [database[id]['encoding'] for id in database.keys()]
+    start = time.perf_counter()
+    # Votes come only from faces encoded in this frame, never from reused identities,
+    # and only frames that ran detection feed the vote window and the adaptive detector
+    fresh, detected = [], []
+    
+    def detect(img):
+        detected.append(True)
+        return detect_faces(img)
+    
+    def identify(img, boxes):
+        identities = identify_faces(img, boxes, TOLERANCE)
+        fresh.extend(identities)
+        return identities
+    
+    # Until confirmed, identified tracks are encoded again at each detection to collect votes
+    reencode = None
+    if voter is not None:
+        reencode = lambda identity: identity[1] not in voter.confirmed
+    regions = None
+    if motion is not None:
+        with metrics.timer('motion'):
+            regions = motion.regions(image)
+        metrics.inc('motion_gated' if regions == [] else 'motion_processed')
+    
+    if regions == [] and motion.last_faces is not None:
+        # Nothing moved: the last result still holds
+        faces = motion.last_faces
+    elif tracker is not None:
+        faces = tracker.update(image, detect, identify, reencode, gallery)
+    elif regions:
+        # Only look where something moved; faces elsewhere keep their last identity
+        face_locations = detect_in_regions(image, regions)
+        detected.append(True)
+        kept = [face for face in motion.last_faces or [] if not any(iou(face[0], region) > 0 for region in regions)]
+        faces = kept + [(box,) + identity for box, identity in zip(face_locations, identify(image, face_locations))]
+    else:
+        face_locations = detect(image)
+        faces = [(box,) + identity for box, identity in zip(face_locations, identify(image, face_locations))]
+    if motion is not None:
+        motion.last_faces = faces
+    # Only frames that ran detection count towards the vote window
+    if voter is not None and detected:
+        voter.observe([(id, name, distance) for name, id, distance in fresh])
+    
+    with metrics.timer('draw'):
+        if overlay is not None:
+            overlay.apply(image, faces)
+        else:
+            draw_faces(image, faces)
+    elapsed = time.perf_counter() - start
+    # Gated and tracked frames take microseconds and would drag the detection scale back up
+    if detected:
+        detector.observe(elapsed)
+    metrics.observe('recognize', elapsed)
+    metrics.tick('recognized_frames')
+    metrics.set('faces_per_frame', len(faces))
+    metrics.inc('faces', len(faces))
+    
     name = 'Unknown'
     id = 'Unknown'
-    face_locations = frg.face_locations(image)
-    face_encodings = frg.face_encodings(image, face_locations)
-    
-    for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-        matches = frg.compare_faces(known_encoding, face_encoding, tolerance=TOLERANCE)
-        distance = frg.face_distance(known_encoding, face_encoding)
-        name = 'Unknown'
-        id = 'Unknown'
-        
-        if True in matches:
-            match_index = matches.index(True)
-            name = database[match_index]['name']
-            id = database[match_index]['id']
-            distance = round(distance[match_index], 2)
-            cv2.putText(image, str(distance), (left, top-30), cv2.FONT_HERSHEY_SIMPLEX, 0.75, (0, 255, 0), 2)
-            
-        cv2.rectangle(image, (left, top), (right, bottom), (0, 255, 0), 2)
-        cv2.putText(image, name, (left, top-10), cv2.FONT_HERSHEY_SIMPLEX, 0.75, (0, 255, 0), 2)
+    if faces:
+        _, name, id, _ = faces[-1]
         
     return image, name, id
 
 def isFaceExists(image):
     """Check if there are faces in the image"""
+    frg = lazy_import('face_recognition')
     face_location = frg.face_locations(image)
     if len(face_location) == 0:
         return False
@@ -94,8 +358,7 @@ def isFaceExists(image):
 
 def submitNew(name, id, image, old_idx=None):
     """Add a new student to the database or update an existing one"""
-    database = get_database()
-    
+    frg = lazy_import('face_recognition')
     # Read image
     if type(image) != np.ndarray:
         image = cv2.imdecode(np.fromstring(image.read(), np.uint8), 1)
@@ -105,85 +368,86 @@ def submitNew(name, id, image, old_idx=None):
         return -1
         
     # Encode image
-    encoding = frg.face_encodings(image)[0]
+    with metrics.timer('enroll_encode'):
+        encoding = frg.face_encodings(image)[0]
     
-    # Check if ID already exists
-    existing_id = [database[i]['id'] for i in database.keys()]
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
     
     # Update mode
     if old_idx is not None:
         new_idx = old_idx
-    # Add mode
+        with metrics.timer('enroll_store'):
+            saved = store.put(new_idx, id, name, encoding, image)
+        if not saved:
+            return 0
+    # Add mode: the ID check and index allocation happen in one store transaction
     else:
-        if id in existing_id:
+        with metrics.timer('enroll_store'):
+            new_idx = store.add(id, name, encoding, image)
+        if new_idx is None:
             return 0
-        new_idx = len(database)
         
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    database[new_idx] = {
-        'image': image,
-        'id': id,
-        'name': name,
-        'encoding': encoding
-    }
-    
-    with open(PKL_PATH, 'wb') as f:
-        pickle.dump(database, f)
+    update_gallery(store.paths, new_idx, id, name, encoding)
+    metrics.inc('enrollments')
         
     return True
 
+def renameStudent(name, id, idx):
+    """Change a student's name or ID, keeping the stored encoding and photo"""
+    with metrics.timer('enroll_store'):
+        if not store.rename(idx, id, name):
+            return 0
+    update_gallery(store.paths, idx, id, name, store.embeddings()[store.records()[idx]['row']])
+    return True
+
 def get_info_from_id(id):
     """Get student information from ID"""
-    database = get_database()
-    for idx, person in database.items():
-        if person['id'] == id:
-            name = person['name']
-            image = person['image']
-            return name, image, idx
-    return None, None, None
+    idx, person = store.find(id)
+    if idx is None:
+        return None, None, None
+    return person['name'], store.thumbnail(person['thumb']), idx
 
 def deleteOne(id):
     """Delete a student from the database"""
-    database = get_database()
-    id = str(id)
-    for key, person in database.items():
-        if person['id'] == id:
-            del database[key]
-            break
-            
-    with open(PKL_PATH, 'wb') as f:
-        pickle.dump(database, f)
+    idx = store.delete(str(id))
+    if idx is not None:
+        update_gallery(store.paths, idx)
         
     return True
 
 def build_dataset():
-    """Build the database from images in the dataset directory"""
-    counter = 0
-    for image in os.listdir(DATASET_DIR):
-        image_path = os.path.join(DATASET_DIR, image)
-        if not image_path.endswith(('.jpg', '.jpeg', '.png')):
-            continue
-            
-        try:
-            image_name = image.split('.')[0]
-            parsed_name = image_name.split('_')
-            person_id = parsed_name[0]
-            person_name = ' '.join(parsed_name[1:])
-            
-            img = frg.load_image_file(image_path)
-            face_encodings = frg.face_encodings(img)
-            
-            if len(face_encodings) > 0:
-                information[counter]['image'] = img
-                information[counter]['id'] = person_id
-                information[counter]['name'] = person_name
-                information[counter]['encoding'] = face_encodings[0]
-                counter += 1
-        except Exception as e:
-            st.error(f"Error processing {image}: {e}")
-
-    with open(PKL_PATH, 'wb') as f:
-        pickle.dump(information, f)
+    """Build the database from images in the dataset directory, re-encoding only changed files"""
+    database, stats, errors = build_database(DATASET_DIR, ENCODING_CACHE, previous=store.file_entries(),
+                                             next_idx=store.next_index())
+    for image, error in errors:
+        st.error(f"Error processing {image}: {error}")
+
+    with metrics.timer('rebuild_store'):
+        store.write_all(database)
+    invalidate_gallery()
+    return stats
+
+def show_metrics(container):
+    """Render FPS, per-stage p50/p95 latencies, gallery size and faces per frame"""
+    snapshot = metrics.snapshot()
+    with container.container():
+        fps = snapshot['fps'].get('recognized_frames', 0.0)
+        faces = snapshot['counters'].get('faces', 0)
+        frames = snapshot['stages'].get('recognize', {}).get('count', 0)
+        st.caption(f"Recognition {fps} FPS | Gallery {snapshot['gauges'].get('gallery_size', 0)} | "
+                   f"Faces/frame {faces / frames if frames else 0:.1f}")
+        if quality_gate is not None:
+            quality = quality_gate.stats()
+            st.caption(f"Quality gate skipped {quality['skip_rate']:.0%} of {quality['checked']} faces "
+                       f"(size {quality['size']}, blur {quality['sharpness']}, "
+                       f"light {quality['brightness']}, pose {quality['pose']})")
+        # A markdown table keeps pandas out of pages that do not need it
+        if snapshot['stages']:
+            rows = [f"| {stage} | {s['p50_ms']} | {s['p95_ms']} | {s['count']} |"
+                    for stage, s in sorted(snapshot['stages'].items())]
+            st.markdown("\n".join(["| Stage | p50 ms | p95 ms | n |", "|---|---|---|---|"] + rows))
+        else:
+            st.caption("No timings recorded yet")
 
 # Main Application
 def main():
@@ -212,8 +476,13 @@ def main():
     with st.sidebar.expander("Developer Tools", expanded=False):
         if st.button('REBUILD DATASET'):
             with st.spinner("Rebuilding dataset..."):
-                build_dataset()
-            st.success("Dataset has been reset")
+                stats = build_dataset()
+            st.success(f"Dataset has been reset: {stats['encoded']} encoded, "
+                       f"{stats['reused']} unchanged, {stats['removed']} removed")
+    
+    # Performance panel, refreshed while the webcam runs
+    with st.sidebar.expander("Performance", expanded=False):
+        metrics_container = st.empty()
     
     # Home page
     if app_mode == "Home":
@@ -244,19 +513,30 @@ def main():
     elif app_mode == "Live Tracking":
         st.title("Live Attendance Tracking")
         
-        tracking_mode = st.radio("Select Input Method", ["Webcam", "Upload Image"])
+        tracking_mode = st.radio("Select Input Method", ["Webcam", "Upload Image", "Recorded Lecture", "All Cameras"])
         
         if tracking_mode == "Upload Image":
             st.write(PICTURE_PROMPT)
             uploaded_images = st.file_uploader("Upload", type=['jpg', 'png', 'jpeg'], accept_multiple_files=True)
             
             if len(uploaded_images) != 0:
-                for image in uploaded_images:
-                    image = frg.load_image_file(image)
-                    image, name, id = recognize(image, TOLERANCE)
-                    name_container.info(f"Name: {name}")
-                    id_container.success(f"ID: {id}")
-                    st.image(image)
+                recognizer = get_upload_recognizer(
+                    store.paths, store.gallery_arrays, **UPLOAD_PARAMS,
+                    backend=SEARCH_BACKEND, search_params=SEARCH_PARAMS,
+                    detection=DETECTION_PARAMS, quality=QUALITY_PARAMS,
+                )
+                uploads = [(image.name, image.getvalue()) for image in uploaded_images]
+                # Results arrive as each image finishes; cached ones straight away
+                with metrics.timer('recognize_uploads'):
+                    for file_name, faces, image in recognizer.recognize(uploads, TOLERANCE, annotate=draw_faces):
+                        if isinstance(faces, str):
+                            st.error(f"{file_name}: {faces}")
+                            continue
+                        if faces:
+                            _, name, id, _ = faces[-1]
+                            name_container.info(f"Name: {name}")
+                            id_container.success(f"ID: {id}")
+                        st.image(image, caption=file_name)
             else:
                 st.info("Please upload an image")
         
@@ -269,62 +549,196 @@ def main():
             FRAME_WINDOW = st.image([])
             
             if start_webcam:
-                cam = cv2.VideoCapture(0)
-                cam.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-                cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+                tracker = FaceTracker(**TRACKING_PARAMS) if TRACKING_ENABLED else None
+                motion = MotionGate(**MOTION_PARAMS) if MOTION_ENABLED else None
+                overlay = OverlayCache(draw_box, draw_label)
+                writer = AttendanceWriter() if AUTO_MARK else None
+                voter = VoteAggregator(VOTE_WINDOW, MIN_VOTES, sink=writer.mark if writer else None)
+                stream = get_stream(**LIVE_VIEW_PARAMS) if LIVE_VIEW_MODE == 'mjpeg' else None
+                if stream is not None:
+                    FRAME_WINDOW.markdown(f'<img src="{LIVE_VIEW_URL or stream.url}" style="width: 100%">',
+                                          unsafe_allow_html=True)
+                
+                def process(frame):
+                    image, name, id = recognize(frame, TOLERANCE, tracker, motion, overlay, voter)
+                    # Idle frames publish nothing, so the last rendered frame stays up
+                    if motion is not None and motion.idle:
+                        return None
+                    # JPEG encoding happens here, in the worker threads, not in the UI loop
+                    if stream is not None:
+                        return stream.encode(image), name, id
+                    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB), name, id
+                
+                stats_container = st.empty()
+                pipeline = WebcamPipeline(CAMERA_INDEX, process, CAMERA_WIDTH, CAMERA_HEIGHT,
+                                          workers=PIPELINE_WORKERS)
                 
-                while not stop_webcam:
-                    ret, frame = cam.read()
-                    if not ret:
-                        st.error("Failed to capture frame from camera")
-                        st.info("Please turn off other apps using the camera and restart")
-                        break
+                # Stopping the webcam reruns the script, so release the camera on the way out
+                last_panel = 0.0
+                try:
+                    pipeline.start()
+                    while not stop_webcam:
+                        result = pipeline.latest(timeout=1.0)
+                        if pipeline.error:
+                            st.error(pipeline.error)
+                            st.info("Please turn off other apps using the camera and restart")
+                            break
+                        if result is None:
+                            continue
+                            
+                        image, name, id = result
+                        
+                        name_container.info(f"Name: {name}")
+                        id_container.success(f"ID: {id}")
+                        with metrics.timer('render'):
+                            if stream is not None:
+                                stream.publish(image)
+                            else:
+                                FRAME_WINDOW.image(image)
+                        
+                        if time.perf_counter() - last_panel > 1.0:
+                            show_metrics(metrics_container)
+                            last_panel = time.perf_counter()
                         
-                    image, name, id = recognize(frame, TOLERANCE)
-                    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                        stats = pipeline.stats()
+                        caption = (
+                            f"Capture {stats['capture_fps']} FPS | "
+                            f"Recognition {stats['process_fps']} FPS | "
+                            f"Display {stats['render_fps']} FPS | "
+                            f"Latency {stats['latency_ms']} ms | "
+                            f"Dropped {stats['dropped_frames']} frames"
+                        )
+                        if motion is not None:
+                            hour, counts = next(reversed(motion.stats().items()))
+                            caption += f" | Motion {hour}: {counts['processed']} processed, {counts['gated']} skipped"
+                        caption += f" | {len(voter.confirmed)} {'marked' if writer else 'confirmed'}"
+                        stats_container.caption(caption)
+                finally:
+                    pipeline.stop()
+                    if stream is not None:
+                        stream.close()
+                    if writer:
+                        writer.close()
+        
+        elif tracking_mode == "Recorded Lecture":
+            uploaded_video = st.file_uploader("Upload lecture video", type=['mp4', 'avi', 'mov', 'mkv'])
+            lecture_start = st.text_input("Recording started at (YYYY-MM-DD HH:MM:SS)",
+                                          value=time.strftime("%Y-%m-%d %H:%M:%S"))
+            
+            started_at = None
+            if uploaded_video is not None and st.button("Process Video"):
+                # Checked up front so a typo does not cost a full pass over the video
+                try:
+                    started_at = datetime.datetime.strptime(lecture_start.strip(), "%Y-%m-%d %H:%M:%S")
+                except ValueError:
+                    st.error(f"Recording start '{lecture_start}' is not in YYYY-MM-DD HH:MM:SS format")
+            
+            if started_at is not None:
+                # Frames are streamed from disk, so spool the upload to a private temporary file first
+                with tempfile.NamedTemporaryFile(suffix=os.path.splitext(uploaded_video.name)[1],
+                                                 delete=False) as f:
+                    video_path = f.name
+                try:
+                    with open(video_path, 'wb') as f:
+                        for chunk in iter(lambda: uploaded_video.read(1 << 20), b''):
+                            f.write(chunk)
                     
-                    name_container.info(f"Name: {name}")
-                    id_container.success(f"ID: {id}")
-                    FRAME_WINDOW.image(image)
+                    cap = cv2.VideoCapture(video_path)
+                    length = max(cap.get(cv2.CAP_PROP_FRAME_COUNT) / (cap.get(cv2.CAP_PROP_FPS) or 30.0), 1.0)
+                    cap.release()
+                    progress = st.progress(0.0)
+                    with st.spinner("Processing video..."):
+                        timeline, stats = process_video(
+                            video_path, store.gallery_arrays, tolerance=TOLERANCE,
+                            backend=SEARCH_BACKEND, search_params=SEARCH_PARAMS, detection=DETECTION_PARAMS,
+                            progress=lambda offset: progress.progress(min(offset / length, 1.0)),
+                            **VIDEO_PARAMS,
+                        )
+                finally:
+                    os.remove(video_path)
+                progress.progress(1.0)
+                
+                st.success(f"{len(timeline)} students seen in {stats['video_seconds']:.0f}s of video "
+                           f"({stats['sampled']} of {stats['frames']} frames recognized, "
+                           f"{stats['speedup']}x real time)")
+                if timeline:
+                    pd = lazy_import('pandas')
+                    st.dataframe(pd.DataFrame.from_dict(timeline, orient='index').rename_axis('ID'))
+                    if AUTO_MARK:
+                        lecture = os.path.splitext(uploaded_video.name)[0]
+                        record_timeline(timeline, lecture, started_at)
+                        st.info("Attendance marked from the lecture timeline")
+        
+        elif tracking_mode == "All Cameras":
+            if not MULTICAM_SOURCES:
+                st.warning("No cameras configured. Add capture sources under MULTICAM.SOURCES in config.yaml.")
+            else:
+                st.write(f"Cameras: {', '.join(MULTICAM_SOURCES)}")
+                start_cameras = st.button("Start Cameras")
+                stop_cameras = st.button("Stop Cameras")
+                
+                stats_container = st.empty()
+                recent_container = st.empty()
                 
-                if cam.isOpened():
-                    cam.release()
+                if start_cameras:
+                    writer = AttendanceWriter() if AUTO_MARK else None
+                    recognizer = MultiCameraRecognizer(
+                        MULTICAM_SOURCES, store.paths, store.gallery_arrays,
+                        sink=writer.mark if writer else None,
+                        voter=VoteAggregator(VOTE_WINDOW, MIN_VOTES),
+                        tolerance=TOLERANCE,
+                        backend=SEARCH_BACKEND,
+                        search_params=SEARCH_PARAMS,
+                        detection=DETECTION_PARAMS,
+                        frame_step=MULTICAM_FRAME_STEP,
+                    )
+                    recent = []
+                    pd = lazy_import('pandas')
+                    
+                    # Stopping reruns the script, so shut the workers down on the way out
+                    try:
+                        recognizer.start()
+                        while recognizer.running and not stop_cameras:
+                            recent = (recognizer.poll(timeout=1.0) + recent)[:20]
+                            stats_container.dataframe(pd.DataFrame(recognizer.stats()).T)
+                            if recent:
+                                recent_container.dataframe(
+                                    pd.DataFrame(recent, columns=['Camera', 'ID', 'Name', 'Distance']))
+                        for name, error in recognizer.errors.items():
+                            st.error(f"{name}: {error}")
+                    finally:
+                        recognizer.stop()
+                        if writer:
+                            writer.close()
     
     # Database page
     elif app_mode == "Database":
         st.title("Student Database")
         
-        database = get_database()
+        # Shared, incrementally refreshed view: only the current page is materialized
+        with metrics.timer('get_database'):
+            roster = get_roster(store)
         
-        if not database:
+        if not len(roster):
             st.warning("Database is empty. Please add students or rebuild the dataset.")
         else:
-            # Convert database to DataFrame for better display
-            data = []
-            for idx, person in database.items():
-                data.append({
-                    "Index": idx,
-                    "ID": person['id'],
-                    "Name": person['name']
-                })
-            
-            df = pd.DataFrame(data)
-            
-            # Add search functionality
+            # Search by name or ID, served by the roster's index
             search_term = st.text_input("Search by name or ID")
-            if search_term:
-                filtered_df = df[df['Name'].str.contains(search_term, case=False) | 
-                                df['ID'].str.contains(search_term, case=False)]
-            else:
-                filtered_df = df
+            _, total = roster.search(search_term, 0, 1)
+            pages = max(1, -(-total // DATABASE_PAGE_SIZE))
+            page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1) - 1
+            with metrics.timer('database_search'):
+                results, total = roster.search(search_term, page, DATABASE_PAGE_SIZE)
+            st.caption(f"{total} of {len(roster)} students")
             
             # Display table
-            st.dataframe(filtered_df)
+            data = [{"Index": idx, "ID": person['id'], "Name": person['name']} for idx, person in results]
+            st.dataframe(data)
             
             # Display selected student details
             st.subheader("Student Details")
             selected_id = st.selectbox("Select a student ID to view details", 
-                                      options=[person['id'] for person in database.values()])
+                                      options=[person['id'] for _, person in results])
             
             if selected_id:
                 name, image, idx = get_info_from_id(selected_id)
@@ -414,10 +828,6 @@ def main():
                     if st.button("Update"):
                         name = old_name
                         student_id = id
-                        image = old_image
-                        
-                        if new_image is not None:
-                            image = cv2.imdecode(np.frombuffer(new_image.read(), np.uint8), cv2.IMREAD_COLOR)
                         
                         if new_name != old_name:
                             name = new_name
@@ -425,7 +835,12 @@ def main():
                         if new_id != id:
                             student_id = new_id
                         
-                        ret = submitNew(name, student_id, image, old_idx=old_idx)
+                        # Only a new photo is encoded; name and ID changes keep the enrolled encoding
+                        if new_image is not None:
+                            image = cv2.imdecode(np.frombuffer(new_image.read(), np.uint8), cv2.IMREAD_COLOR)
+                            ret = submitNew(name, student_id, image, old_idx=old_idx)
+                        else:
+                            ret = renameStudent(name, student_id, old_idx)
                         
                         if ret == 1:
                             st.success("Student Updated")
@@ -477,13 +892,17 @@ def main():
         
         dataset_dir = st.text_input("Dataset Directory", value=DATASET_DIR)
         database_path = st.text_input("Database Path", value=PKL_PATH)
+        store_dir = st.text_input("Store Directory", value=STORE_DIR)
         
         if st.button("Save Settings"):
-            # Create new config
-            new_config = {
+            # Create new config, keeping sections this page does not edit
+            new_config = dict(cfg)
+            new_config.update({
                 'PATH': {
+                    **cfg.get('PATH', {}),
                     'DATASET_DIR': dataset_dir,
-                    'PKL_PATH': database_path
+                    'PKL_PATH': database_path,
+                    'STORE_DIR': store_dir
                 },
                 'INFO': {
                     'PICTURE_PROMPT': PICTURE_PROMPT,
@@ -495,17 +914,26 @@ def main():
                     'HEIGHT': camera_height
                 },
                 'RECOGNITION': {
+                    **cfg.get('RECOGNITION', {}),
                     'DEFAULT_TOLERANCE': default_tolerance,
                     'AUTO_MARK': auto_mark,
                     'SHOW_DISTANCE': show_distance
                 }
-            }
+            })
             
             # Save config
             with open('config.yaml', 'w') as f:
                 yaml.dump(new_config, f)
             
             st.success("Settings saved successfully. Please restart the application for changes to take effect.")
+    
+    # Cold start is the first run in this process, when every import is paid for
+    elapsed = time.perf_counter() - SCRIPT_START
+    if 'cold_start_seconds' not in metrics.gauges:
+        metrics.set('cold_start_seconds', round(elapsed, 3))
+    else:
+        metrics.observe('rerun', elapsed)
+    show_metrics(metrics_container)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,287 @@
+"""
+Offline benchmarks for recognition, dataset building, storage and attendance
+
+Run from the repository root:
+
+    python -m benchmarks.bench --output bench_results.json
+    python -m benchmarks.bench --quick --only matching,attendance
+
+Galleries, classroom frames and attendance history are all synthesized from
+the sample photos in dataset/, so nothing needs a camera or the network.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+SAMPLE_DIR = 'dataset'
+SECTIONS = ('startup', 'matching', 'frames', 'dataset', 'store', 'attendance')
+STARTUP_MODULES = ('cv2', 'pandas', 'face_recognition', 'streamlit', 'app')
+
+
+class Timer:
+    """Collects named latency samples and reports percentiles in milliseconds"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def time(self, name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.samples.setdefault(name, []).append(time.perf_counter() - start)
+        return result
+
+    def report(self):
+        report = {}
+        for name, samples in self.samples.items():
+            ms = np.array(samples) * 1000
+            report[name] = {
+                'n': len(ms),
+                'mean_ms': round(float(ms.mean()), 4),
+                'p50_ms': round(float(np.percentile(ms, 50)), 4),
+                'p95_ms': round(float(np.percentile(ms, 95)), 4),
+                'p99_ms': round(float(np.percentile(ms, 99)), 4),
+            }
+        return report
+
+
+def sample_images():
+    """RGB sample photos from the dataset directory"""
+    import face_recognition as frg
+
+    paths = sorted(
+        os.path.join(SAMPLE_DIR, f) for f in os.listdir(SAMPLE_DIR) if f.endswith(('.jpg', '.jpeg', '.png'))
+    )
+    return [frg.load_image_file(path) for path in paths], paths
+
+
+def synthetic_encodings(n, seed=0):
+    """Random encodings spread like real ones: small values around a shared mean"""
+    rng = np.random.default_rng(seed)
+    return rng.normal(0, 0.1, (n, 128)).astype(np.float32)
+
+
+def make_frame(images, faces, tile=240):
+    """Tile ``faces`` sample photos into one frame, like a row of students"""
+    cols = int(np.ceil(np.sqrt(faces)))
+    rows = int(np.ceil(faces / cols))
+    frame = np.zeros((rows * tile, cols * tile, 3), dtype=np.uint8)
+    for i in range(faces):
+        image = images[i % len(images)]
+        scale = tile / float(max(image.shape[:2]))
+        resized = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+        r, c = divmod(i, cols)
+        frame[r * tile:r * tile + resized.shape[0], c * tile:c * tile + resized.shape[1]] = resized
+    return frame
+
+
+def bench_startup(repeats):
+    """Cold import time of each heavy module and of app.py, each in a fresh interpreter"""
+    timer = Timer()
+    script = "import time; start = time.perf_counter(); import {}; print(time.perf_counter() - start)"
+    for module in STARTUP_MODULES:
+        for _ in range(repeats):
+            result = subprocess.run([sys.executable, '-c', script.format(module)],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                break
+            timer.samples.setdefault(f'import_{module}', []).append(float(result.stdout.split()[-1]))
+    return timer.report()
+
+
+def bench_matching(sizes, repeats, faces_per_frame=(1, 4, 16)):
+    """Gallery matching latency for exact, quantized and IVF search at several sizes"""
+    from utils.gallery import Gallery
+    from utils.search import make_index
+
+    results = {}
+    for size in sizes:
+        encodings = synthetic_encodings(size)
+        keys = list(range(size))
+        for name, backend, params in (('exact', 'exact', {}), ('int8', 'exact', {'quantize': 'int8'}),
+                                      ('ivf', 'ivf', {})):
+            timer = Timer()
+            gallery = timer.time('build', Gallery, keys, [str(k) for k in keys], [str(k) for k in keys],
+                                 encodings, index=make_index(backend, **params))
+            rng = np.random.default_rng(1)
+            for faces in faces_per_frame:
+                for _ in range(repeats):
+                    picks = rng.choice(size, faces)
+                    queries = encodings[picks] + rng.normal(0, 0.02, (faces, 128)).astype(np.float32)
+                    timer.time(f'match_{faces}_faces', gallery.match, queries, 0.5)
+            results[f'{name}_{size}'] = timer.report()
+    return results
+
+
+def bench_frames(face_counts, repeats):
+    """Per-stage latency of recognize() on frames with varying face counts"""
+    import face_recognition as frg
+
+    import app
+
+    images, _ = sample_images()
+    gallery = app.load_gallery()
+    results = {}
+    for faces in face_counts:
+        frame = make_frame(images, faces)
+        timer = Timer()
+        for _ in range(repeats):
+            image = frame.copy()
+            boxes = timer.time('detect', app.detect_faces, image)
+            encodings = timer.time('encode', frg.face_encodings, image, boxes)
+            matches = timer.time('match', gallery.match, encodings, 0.5)
+            faces_found = [(box, 'Unknown', 'Unknown', distance) for box, (_, distance) in zip(boxes, matches)]
+            timer.time('draw', app.draw_faces, image, faces_found)
+            timer.time('to_rgb', cv2.cvtColor, image, cv2.COLOR_BGR2RGB)
+            timer.time('recognize', app.recognize, frame.copy(), 0.5)
+        results[f'{faces}_faces'] = dict(timer.report(), detected=len(boxes))
+    return results
+
+
+def bench_dataset(copies, workdir):
+    """Cold and incremental build_dataset over copies of the sample photos"""
+    from utils.dataset import build_database
+
+    dataset_dir = os.path.join(workdir, 'dataset')
+    os.makedirs(dataset_dir)
+    _, paths = sample_images()
+    for i in range(copies):
+        path = paths[i % len(paths)]
+        shutil.copy(path, os.path.join(dataset_dir, f"{i}_Student_{i}.jpg"))
+    cache_path = os.path.join(workdir, 'cache.pkl')
+
+    timer = Timer()
+    database, cold, _ = timer.time('cold_build', build_database, dataset_dir, cache_path)
+    _, warm, _ = timer.time('unchanged_rebuild', build_database, dataset_dir, cache_path, previous=database)
+    # Touch a handful of files and add one more
+    for i in range(min(5, copies)):
+        os.utime(os.path.join(dataset_dir, f"{i}_Student_{i}.jpg"))
+    shutil.copy(paths[0], os.path.join(dataset_dir, f"{copies}_Student_{copies}.jpg"))
+    _, changed, _ = timer.time('few_changed_rebuild', build_database, dataset_dir, cache_path, previous=database)
+    return dict(timer.report(), images=copies, cold=cold, unchanged=warm, few_changed=changed)
+
+
+def bench_store(size, repeats, workdir):
+    """Enrollment store write, lookup and gallery load latency"""
+    from utils.store import EnrollmentStore
+
+    store = EnrollmentStore(os.path.join(workdir, 'store'))
+    encodings = synthetic_encodings(size)
+    thumb = np.zeros((320, 240, 3), dtype=np.uint8)
+    timer = Timer()
+    timer.time('write_all', store.write_all, {
+        i: {'id': str(i), 'name': f"Student {i}", 'encoding': encodings[i], 'image': thumb if i < 50 else None}
+        for i in range(size)
+    })
+    rng = np.random.default_rng(2)
+    for i in range(repeats):
+        timer.time('add', store.add, f"new{i}", "New", encodings[0], thumb)
+        timer.time('find', store.find, str(rng.integers(size)))
+        timer.time('delete', store.delete, f"new{i}")
+    for _ in range(max(1, repeats // 10)):
+        store._cache = None
+        timer.time('gallery_arrays_cold', store.gallery_arrays)
+    return dict(timer.report(), students=size)
+
+
+def synthesize_attendance(directory, days, students, seed=3):
+    """Write ``days`` daily CSVs with one row per attending student"""
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    start = datetime.date.today() - datetime.timedelta(days=days - 1)
+    for d in range(days):
+        date = (start + datetime.timedelta(days=d)).strftime("%Y-%m-%d")
+        attending = np.flatnonzero(rng.random(students) < 0.85)
+        with open(os.path.join(directory, f"{date}.csv"), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['ID', 'Name', 'Time', 'Status'])
+            for s in attending:
+                status = 'late' if rng.random() < 0.1 else 'present'
+                writer.writerow([str(s), f"Student {s}", f"09:{rng.integers(60):02d}:00", status])
+    return start.strftime("%Y-%m-%d")
+
+
+def bench_attendance(days, students, repeats, workdir):
+    """Per-student and class-wide attendance queries over synthetic history"""
+    from utils import attendance
+    from utils.attendance_analytics import AttendanceAnalytics
+
+    directory = os.path.join(workdir, 'attendance')
+    start_date = synthesize_attendance(directory, days, students)
+    attendance.ATTENDANCE_DIR = directory
+
+    timer = Timer()
+    analytics = AttendanceAnalytics(directory)
+    timer.time('index_first_sync', analytics.index.sync)
+    rng = np.random.default_rng(4)
+    for _ in range(repeats):
+        timer.time('student_summary', attendance.get_student_attendance_summary,
+                   str(rng.integers(students)), start_date)
+        timer.time('day_report', attendance.get_attendance_report, start_date)
+    timer.time('class_summary_cold', analytics.summary, start_date)
+    for _ in range(max(1, repeats // 5)):
+        timer.time('class_summary_cached', analytics.summary, start_date)
+    return dict(timer.report(), days=days, students=students)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognition, storage and attendance benchmarks")
+    parser.add_argument('--sizes', default='1000,10000,100000', help="Gallery sizes for matching")
+    parser.add_argument('--faces', default='1,2,4,8', help="Faces per synthetic frame")
+    parser.add_argument('--repeats', type=int, default=20, help="Samples per measurement")
+    parser.add_argument('--dataset-copies', type=int, default=60, help="Photos for the build_dataset run")
+    parser.add_argument('--days', type=int, default=120, help="Days of synthetic attendance")
+    parser.add_argument('--students', type=int, default=3000, help="Students in the synthetic class")
+    parser.add_argument('--only', default=','.join(SECTIONS), help="Comma separated sections to run")
+    parser.add_argument('--quick', action='store_true', help="Small sizes for a fast smoke run")
+    parser.add_argument('--output', default='bench_results.json', help="Where to save the JSON results")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.sizes, args.faces, args.repeats = '1000,10000', '1,4', 5
+        args.dataset_copies, args.days, args.students = 9, 30, 300
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    face_counts = [int(faces) for faces in args.faces.split(',')]
+    only = set(args.only.split(','))
+
+    results = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'args': vars(args),
+    }
+    workdir = tempfile.mkdtemp(prefix='face-attendance-bench-')
+    try:
+        if 'startup' in only:
+            results['startup'] = bench_startup(max(1, args.repeats // 4))
+        if 'matching' in only:
+            results['matching'] = bench_matching(sizes, args.repeats)
+        if 'frames' in only:
+            results['frames'] = bench_frames(face_counts, args.repeats)
+        if 'dataset' in only:
+            results['dataset'] = bench_dataset(args.dataset_copies, workdir)
+        if 'store' in only:
+            results['store'] = bench_store(max(sizes), args.repeats, workdir)
+        if 'attendance' in only:
+            results['attendance'] = bench_attendance(args.days, args.students, args.repeats, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+    print(json.dumps({k: v for k, v in results.items() if k not in ('args', 'machine')}, indent=2, default=str))
+    print(f"Saved results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+import argparse
+import base64
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from urllib.request import Request, urlopen
+
+import cv2
+import face_recognition as frg
+import numpy as np
+
+import app
+from utils.attendance import get_attendance_report
+from utils.metrics import metrics
+
+SERVICE = app.cfg.get('SERVICE') or {}
+HOST = SERVICE.get('HOST', '127.0.0.1')
+PORT = SERVICE.get('PORT', 8000)
+BATCH_WINDOW_MS = SERVICE.get('BATCH_WINDOW_MS', 20)
+MAX_BATCH = SERVICE.get('MAX_BATCH', 16)
+DEFAULT_TOLERANCE = (app.cfg.get('RECOGNITION') or {}).get('DEFAULT_TOLERANCE', 0.5)
+
+
+class RecognitionBatcher:
+    """
+    Collects recognition requests from concurrent clients into micro-batches
+
+    The first request of a batch opens a window of ``window_ms``; every
+    request arriving within it (up to ``max_batch``) is processed together
+    by a single worker thread, so all kiosks share one gallery and one
+    vectorized matching pass.
+
+    Args:
+        process_batch (callable): Takes a list of items, returns one result each
+        window_ms (float): How long to wait for more requests after the first
+        max_batch (int): Largest batch processed at once
+    """
+
+    def __init__(self, process_batch, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH):
+        self.process_batch = process_batch
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.stats = {'requests': 0, 'batches': 0, 'largest_batch': 0}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue one item and return a Future for its result"""
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+            try:
+                results = self.process_batch([item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+def recognize_batch(items):
+    """
+    Recognize faces in several images with one gallery matching pass
+
+    dlib detects and encodes one image at a time, so those stages run per
+    image; the encodings of every face in the batch are then matched against
+    the gallery together.
+
+    Args:
+        items (list): (RGB image, tolerance) tuples
+
+    Returns:
+        list: One list of face dicts (box, name, id, distance) per image
+    """
+    gallery = app.load_gallery()
+
+    boxes = [app.detect_faces(image) for image, _ in items]
+    passed = [app.check_quality(image, image_boxes) for (image, _), image_boxes in zip(items, boxes)]
+    with metrics.timer('encode'):
+        encodings = [
+            frg.face_encodings(image, [box for box, ok in zip(image_boxes, image_passed) if ok])
+            for (image, _), image_boxes, image_passed in zip(items, boxes, passed)
+        ]
+    flat = [encoding for image_encodings in encodings for encoding in image_encodings]
+    with metrics.timer('match'):
+        matches = iter(gallery.match(flat, float('inf')))
+    metrics.set('batch_size', len(items))
+
+    results = []
+    for (_, tolerance), image_boxes, image_passed in zip(items, boxes, passed):
+        faces = []
+        for (top, right, bottom, left), ok in zip(image_boxes, image_passed):
+            row, distance = next(matches) if ok else (-1, float('inf'))
+            known = row >= 0 and distance <= tolerance
+            faces.append({
+                'box': [int(top), int(right), int(bottom), int(left)],
+                'name': gallery.names[row] if known else 'Unknown',
+                'id': gallery.ids[row] if known else 'Unknown',
+                'distance': round(distance, 4) if np.isfinite(distance) else None,
+            })
+        results.append(faces)
+    return results
+
+
+batcher = None
+
+
+def decode_image(data):
+    """Decode JPEG/PNG bytes into a BGR image"""
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not decode image")
+    return image
+
+
+class Handler(BaseHTTPRequestHandler):
+    """JSON API over the recognition, enrollment and attendance functions"""
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status, text, content_type='text/plain; version=0.0.4'):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length)
+
+    def _json(self):
+        body = self._body()
+        return json.loads(body) if body else {}
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        return parts, query
+
+    def _handle(self, method):
+        parts, query = self._route()
+        try:
+            handler = getattr(self, f"_{method}_{parts[0].replace('-', '_')}" if parts else '', None)
+            if handler is None:
+                return self._send(404, {'error': 'Not found'})
+            return handler(parts[1:], query)
+        except (ValueError, KeyError) as e:
+            return self._send(400, {'error': str(e)})
+        except Exception as e:
+            return self._send(500, {'error': str(e)})
+
+    def do_GET(self):
+        self._handle('get')
+
+    def do_POST(self):
+        self._handle('post')
+
+    def do_PUT(self):
+        self._handle('put')
+
+    def do_DELETE(self):
+        self._handle('delete')
+
+    def log_message(self, format, *args):
+        pass
+
+    def _post_recognize(self, args, query):
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            payload = self._json()
+            data = base64.b64decode(payload['image'])
+            tolerance = float(payload.get('tolerance', DEFAULT_TOLERANCE))
+        else:
+            data = self._body()
+            tolerance = float(query.get('tolerance', DEFAULT_TOLERANCE))
+
+        image = cv2.cvtColor(decode_image(data), cv2.COLOR_BGR2RGB)
+        faces = batcher.submit((image, tolerance)).result()
+        name, id = (faces[-1]['name'], faces[-1]['id']) if faces else ('Unknown', 'Unknown')
+        self._send(200, {'faces': faces, 'name': name, 'id': id})
+
+    def _get_students(self, args, query):
+        if args:
+            name, _, idx = app.get_info_from_id(args[0])
+            if name is None:
+                return self._send(404, {'error': 'Student ID does not exist'})
+            return self._send(200, {'index': idx, 'id': args[0], 'name': name})
+        students = [
+            {'index': idx, 'id': person['id'], 'name': person['name']}
+            for idx, person in app.get_database().items()
+        ]
+        self._send(200, students)
+
+    def _submit_result(self, ret, success_status):
+        if ret == -1:
+            return self._send(422, {'error': 'There is no face in the picture'})
+        if ret == 0:
+            return self._send(409, {'error': 'Student ID already exists'})
+        return self._send(success_status, {'ok': True})
+
+    def _post_students(self, args, query):
+        payload = self._json()
+        image = decode_image(base64.b64decode(payload['image']))
+        ret = app.submitNew(payload['name'], str(payload['id']), image)
+        self._submit_result(ret, 201)
+
+    def _put_students(self, args, query):
+        old_name, _, old_idx = app.get_info_from_id(args[0])
+        if old_name is None:
+            return self._send(404, {'error': 'Student ID does not exist'})
+
+        payload = self._json()
+        name, id = payload.get('name', old_name), str(payload.get('id', args[0]))
+        if payload.get('image'):
+            image = decode_image(base64.b64decode(payload['image']))
+            ret = app.submitNew(name, id, image, old_idx=old_idx)
+        else:
+            ret = app.renameStudent(name, id, old_idx)
+        self._submit_result(ret, 200)
+
+    def _delete_students(self, args, query):
+        name, _, _ = app.get_info_from_id(args[0])
+        if name is None:
+            return self._send(404, {'error': 'Student ID does not exist'})
+        app.deleteOne(args[0])
+        self._send(200, {'ok': True})
+
+    def _get_attendance(self, args, query):
+        self._send(200, get_attendance_report(query.get('date'), query.get('student_id')))
+
+    def _post_update_dataset(self, args, query):
+        # Optional uploads: {"files": [{"filename": "12_Jane_Doe.jpg", "image": <base64>}]}
+        for upload in self._json().get('files', []):
+            filename = os.path.basename(upload['filename'])
+            with open(os.path.join(app.DATASET_DIR, filename), 'wb') as f:
+                f.write(base64.b64decode(upload['image']))
+        self._send(200, app.build_dataset())
+
+    def _get_stats(self, args, query):
+        quality = app.quality_gate.stats() if app.quality_gate is not None else None
+        self._send(200, dict(batcher.stats, gallery_size=len(app.load_gallery()), quality=quality,
+                             **metrics.snapshot()))
+
+    def _get_metrics(self, args, query):
+        metrics.set('batch_requests', batcher.stats['requests'])
+        metrics.set('batches', batcher.stats['batches'])
+        self._send_text(200, metrics.prometheus())
+
+
+def serve(host=HOST, port=PORT, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH):
+    """Run the recognition service until interrupted"""
+    global batcher
+
+    batcher = RecognitionBatcher(recognize_batch, window_ms, max_batch)
+    app.load_gallery()
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Serving on http://{host}:{port} (batch window {window_ms} ms, max batch {max_batch})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def run_client(url, image_path, clients=4, requests=25):
+    """
+    Synthetic load: several kiosks posting the same frame concurrently
+
+    Prints latency percentiles, throughput and the server's batch stats.
+    """
+    with open(image_path, 'rb') as f:
+        data = f.read()
+
+    latencies = []
+    lock = threading.Lock()
+
+    def kiosk():
+        for _ in range(requests):
+            start = time.perf_counter()
+            request = Request(f"{url}/recognize", data=data, headers={'Content-Type': 'image/jpeg'})
+            with urlopen(request) as response:
+                response.read()
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=kiosk) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    print(f"{len(latencies)} requests from {clients} clients in {elapsed:.2f} s "
+          f"({len(latencies) / elapsed:.1f} req/s)")
+    print(f"latency p50 {np.percentile(latencies_ms, 50):.1f} ms, "
+          f"p95 {np.percentile(latencies_ms, 95):.1f} ms")
+    with urlopen(f"{url}/stats") as response:
+        print(f"server stats: {json.loads(response.read())}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless face recognition attendance service")
+    sub = parser.add_subparsers(dest='command')
+
+    serve_parser = sub.add_parser('serve', help="Run the HTTP service (default)")
+    serve_parser.add_argument('--host', default=HOST)
+    serve_parser.add_argument('--port', type=int, default=PORT)
+    serve_parser.add_argument('--window-ms', type=float, default=BATCH_WINDOW_MS)
+    serve_parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+
+    client_parser = sub.add_parser('client', help="Send synthetic concurrent recognition requests")
+    client_parser.add_argument('--url', default=f"http://{HOST}:{PORT}")
+    client_parser.add_argument('--image', default=os.path.join(app.DATASET_DIR, '1_Elon_Musk.jpg'))
+    client_parser.add_argument('--clients', type=int, default=4)
+    client_parser.add_argument('--requests', type=int, default=25)
+
+    args = parser.parse_args()
+    if args.command == 'client':
+        run_client(args.url, args.image, args.clients, args.requests)
+    elif args.command == 'serve':
+        serve(args.host, args.port, args.window_ms, args.max_batch)
+    else:
+        serve()
+
+
+if __name__ == '__main__':
+    main()
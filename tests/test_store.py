@@ -0,0 +1,125 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils.store import ENCODING_DIM, EnrollmentStore
+
+IMAGE = np.full((48, 48, 3), 128, dtype=np.uint8)
+
+
+def encoding(value):
+    return np.full(ENCODING_DIM, value, dtype=np.float32)
+
+
+def gallery(store):
+    """Gallery arrays as {key: (id, name, first encoding value)}"""
+    keys, ids, names, encodings = store.gallery_arrays()
+    return {key: (id, name, float(enc[0])) for key, id, name, enc in zip(keys, ids, names, encodings)}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EnrollmentStore(str(tmp_path), compact_rows=4)
+
+
+def test_round_trip(store, tmp_path):
+    first = store.add('s1', 'Ada', encoding(1), IMAGE)
+    second = store.add('s2', 'Grace', encoding(2), IMAGE)
+
+    idx, record = store.find('s2')
+    assert idx == second
+    assert (record['id'], record['name']) == ('s2', 'Grace')
+    assert store.thumbnail(record['thumb']).shape[2] == 3
+    assert gallery(store) == {first: ('s1', 'Ada', 1.0), second: ('s2', 'Grace', 2.0)}
+
+    reopened = EnrollmentStore(str(tmp_path))
+    assert gallery(reopened) == gallery(store)
+    assert len(reopened) == 2
+
+
+def test_duplicate_id_is_rejected(store):
+    store.add('s1', 'Ada', encoding(1), IMAGE)
+
+    assert store.add('s1', 'Someone else', encoding(9), IMAGE) is None
+    assert len(store) == 1
+    assert len(os.listdir(store.thumbs_dir)) == 1
+
+
+def test_delete_and_compaction(store, tmp_path):
+    keys = [store.add(f's{i}', f'Student {i}', encoding(i), IMAGE) for i in range(3)]
+    assert store.delete('s1') == keys[1]
+    assert store.delete('s1') is None
+    assert store.find('s1') == (None, None)
+
+    # The fourth log record reaches compact_rows and folds the log into generation 1
+    keys.append(store.add('s3', 'Student 3', encoding(3), IMAGE))
+    assert os.path.exists(tmp_path / 'embeddings.1.npy')
+    assert os.path.getsize(tmp_path / 'embeddings.1.log') == 0
+    assert len(store.embeddings()) == 3
+    assert gallery(store) == {
+        keys[0]: ('s0', 'Student 0', 0.0),
+        keys[2]: ('s2', 'Student 2', 2.0),
+        keys[3]: ('s3', 'Student 3', 3.0),
+    }
+
+    # Files older than the previous generation are removed
+    store.compact()
+    store.compact()
+    assert not os.path.exists(tmp_path / 'embeddings.log')
+    assert not os.path.exists(tmp_path / 'embeddings.1.npy')
+    assert len(store.embeddings()) == 3
+    assert gallery(EnrollmentStore(str(tmp_path))) == gallery(store)
+
+
+def test_indexes_are_never_reused(store, tmp_path):
+    keys = [store.add(f's{i}', f'Student {i}', encoding(i), IMAGE) for i in range(3)]
+    assert keys == [0, 1, 2]
+    store.delete('s2')
+
+    assert store.next_index() == 3
+    assert store.add('s9', 'Student 9', encoding(9), IMAGE) == 3
+    assert EnrollmentStore(str(tmp_path)).add('s10', 'Student 10', encoding(10), IMAGE) == 4
+
+
+def test_torn_log_record_is_dropped(store, tmp_path):
+    store.add('s1', 'Ada', encoding(1), IMAGE)
+    with open(tmp_path / 'embeddings.log', 'ab') as f:
+        f.write(b'\x00' * 100)
+
+    key = store.add('s2', 'Grace', encoding(2), IMAGE)
+
+    assert os.path.getsize(tmp_path / 'embeddings.log') == 2 * ENCODING_DIM * 4
+    assert gallery(store)[key] == ('s2', 'Grace', 2.0)
+
+
+def test_rename_keeps_encoding(store):
+    first = store.add('s1', 'Ada', encoding(1), IMAGE)
+    store.add('s2', 'Grace', encoding(2), IMAGE)
+    thumb = store.find('s1')[1]['thumb']
+
+    assert not store.rename(first, 's2', 'Ada')
+    assert not store.rename(99, 's3', 'Nobody')
+    assert store.rename(first, 's3', 'Ada L.')
+
+    assert store.find('s1') == (None, None)
+    idx, record = store.find('s3')
+    assert (idx, record['name'], record['thumb']) == (first, 'Ada L.', thumb)
+    assert gallery(store)[first] == ('s3', 'Ada L.', 1.0)
+
+
+def test_write_all_replaces_the_store(store, tmp_path):
+    store.add('old', 'Old', encoding(7), IMAGE)
+    old_thumb = store.find('old')[1]['thumb']
+
+    store.write_all({
+        5: {'id': 'a', 'name': 'A', 'encoding': encoding(5), 'image': IMAGE, 'file': 'a.jpg'},
+        8: {'id': 'b', 'name': 'B', 'encoding': encoding(8), 'image': IMAGE, 'file': 'b.jpg'},
+    })
+
+    assert store.find('old') == (None, None)
+    assert not os.path.exists(os.path.join(store.thumbs_dir, old_thumb))
+    assert gallery(store) == {5: ('a', 'A', 5.0), 8: ('b', 'B', 8.0)}
+    assert sorted(store.file_entries()) == [5, 8]
+    assert store.next_index() == 9
+    assert store.add('c', 'C', encoding(9), IMAGE) == 9
@@ -1,6 +1,31 @@
+import atexit
 import csv
 import os
 import datetime
+import threading
+
+from utils.attendance_store import get_index
+
+ATTENDANCE_DIR = 'attendance'
+HEADER = ['ID', 'Name', 'Time', 'Status']
+
+def _append_records(date, rows):
+    """
+    Append rows to a day's attendance file in one open/write/close
+    
+    Args:
+        date (str): Date in YYYY-MM-DD format
+        rows (list): [ID, Name, Time, Status] rows
+    """
+    os.makedirs(ATTENDANCE_DIR, exist_ok=True)
+    attendance_file = os.path.join(ATTENDANCE_DIR, f"{date}.csv")
+    file_exists = os.path.isfile(attendance_file)
+    
+    with open(attendance_file, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if not file_exists:
+            writer.writerow(HEADER)
+        writer.writerows(rows)
 
 def mark_attendance(student_id, student_name, status="present"):
     """
@@ -14,34 +39,139 @@ def mark_attendance(student_id, student_name, status="present"):
     Returns:
         bool: True if successful, False otherwise
     """
-    # Create attendance directory if it doesn't exist
-    if not os.path.exists('attendance'):
-        os.makedirs('attendance')
-    
-    # Get current date
     today = datetime.datetime.now().strftime("%Y-%m-%d")
-    
-    # Create attendance file for today if it doesn't exist
-    attendance_file = f"attendance/{today}.csv"
-    file_exists = os.path.isfile(attendance_file)
+    current_time = datetime.datetime.now().strftime("%H:%M:%S")
     
     try:
-        with open(attendance_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            
-            # Write header if file doesn't exist
-            if not file_exists:
-                writer.writerow(['ID', 'Name', 'Time', 'Status'])
-            
-            # Write attendance record
-            current_time = datetime.datetime.now().strftime("%H:%M:%S")
-            writer.writerow([student_id, student_name, current_time, status])
-        
+        _append_records(today, [[student_id, student_name, current_time, status]])
         return True
     except Exception as e:
         print(f"Error marking attendance: {e}")
         return False
 
+class AttendanceWriter:
+    """
+    Buffered attendance writer that marks each student once per session
+    
+    Marks are checked against an in-memory set of IDs already marked in this
+    session, queued, and appended in batches by a background thread at most
+    ``flush_interval`` seconds apart (sooner once ``max_batch`` records are
+    queued). Whatever is still queued is flushed on close() and at exit.
+    A session is the life of the writer: each capture run creates its own.
+    
+    Args:
+        flush_interval (float): Longest time a record waits in the queue
+        max_batch (int): Queue length that triggers an early flush
+    """
+    
+    def __init__(self, flush_interval=2.0, max_batch=256):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.marked = set()
+        self._queue = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def mark(self, student_id, student_name, status="present"):
+        """
+        Queue attendance for a student unless already marked this session
+        
+        Args:
+            student_id (str): Student ID
+            student_name (str): Student name
+            status (str): Attendance status (present, absent, late)
+        
+        Returns:
+            bool: True if queued, False if the student was already marked
+        """
+        now = datetime.datetime.now()
+        date = now.strftime("%Y-%m-%d")
+        with self._cond:
+            if self._closed or (date, student_id) in self.marked:
+                return False
+            self.marked.add((date, student_id))
+            self._queue.append((date, [student_id, student_name, now.strftime("%H:%M:%S"), status]))
+            if len(self._queue) >= self.max_batch:
+                self._cond.notify()
+        return True
+    
+    def flush(self):
+        """Write every queued record, one append per attendance file"""
+        with self._cond:
+            queue, self._queue = self._queue, []
+        if not queue:
+            return
+        
+        by_date = {}
+        for date, row in queue:
+            by_date.setdefault(date, []).append(row)
+        for date, rows in by_date.items():
+            try:
+                _append_records(date, rows)
+            except Exception as e:
+                print(f"Error marking attendance: {e}")
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._queue) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                break
+    
+    def close(self):
+        """Stop the background thread after a final flush"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        # Closed writers need no exit hook; keeping it would keep them alive
+        atexit.unregister(self.close)
+        self._thread.join()
+        self.flush()
+
+def record_timeline(timeline, lecture, started_at, status="present"):
+    """
+    Mark attendance from a recorded lecture and save its presence timeline
+    
+    Each student in the timeline is marked once, at the wall-clock time they
+    were first seen, in the attendance file of the lecture's date. The full
+    timeline is written to ``attendance/timelines/<date>_<lecture>.csv``.
+    
+    Args:
+        timeline (dict): Student ID -> {'name', 'first_seen', 'last_seen',
+            'sightings'} with offsets in seconds from the start of the video
+        lecture (str): Name of the recording
+        started_at (datetime.datetime): Wall-clock time the recording started
+        status (str): Attendance status (present, absent, late)
+    
+    Returns:
+        str: Path of the timeline file
+    """
+    date = started_at.strftime("%Y-%m-%d")
+    clock = lambda offset: (started_at + datetime.timedelta(seconds=offset)).strftime("%H:%M:%S")
+    entries = sorted(timeline.items(), key=lambda item: item[1]['first_seen'])
+    
+    _append_records(date, [[student_id, entry['name'], clock(entry['first_seen']), status]
+                           for student_id, entry in entries])
+    
+    timeline_dir = os.path.join(ATTENDANCE_DIR, 'timelines')
+    os.makedirs(timeline_dir, exist_ok=True)
+    timeline_file = os.path.join(timeline_dir, f"{date}_{lecture}.csv")
+    with open(timeline_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['ID', 'Name', 'First Seen', 'Last Seen', 'Sightings'])
+        for student_id, entry in entries:
+            writer.writerow([student_id, entry['name'], clock(entry['first_seen']),
+                             clock(entry['last_seen']), entry['sightings']])
+    return timeline_file
+
 def get_attendance_report(date=None, student_id=None):
     """
     Get attendance report
@@ -57,21 +187,9 @@ def get_attendance_report(date=None, student_id=None):
     if date is None:
         date = datetime.datetime.now().strftime("%Y-%m-%d")
     
-    # Check if attendance file exists
-    attendance_file = f"attendance/{date}.csv"
-    if not os.path.isfile(attendance_file):
-        return []
-    
     try:
-        records = []
-        with open(attendance_file, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Filter by student ID if specified
-                if student_id is None or row['ID'] == student_id:
-                    records.append(row)
-        
-        return records
+        records = get_index(ATTENDANCE_DIR).records(date=date, student_id=student_id)
+        return [{key: record[key] for key in HEADER} for record in records]
     except Exception as e:
         print(f"Error getting attendance report: {e}")
         return []
@@ -110,34 +228,40 @@ def get_student_attendance_summary(student_id, start_date=None, end_date=None):
         'dates': []
     }
     
-    # Iterate through dates
-    current_dt = start_dt
-    while current_dt &lt;= end_dt:
-        current_date = current_dt.strftime("%Y-%m-%d")
+    # One indexed range scan instead of one file read per day
+    try:
+        records = get_index(ATTENDANCE_DIR).records(
+            student_id=student_id,
+            start_date=start_dt.strftime("%Y-%m-%d"),
+            end_date=end_dt.strftime("%Y-%m-%d")
+        )
+    except Exception as e:
+        print(f"Error getting attendance report: {e}")
+        records = []
+    
+    # First record of each day counts
+    seen_dates = set()
+    for record in records:
+        current_date = record['Date']
+        if current_date in seen_dates:
+            continue
+        seen_dates.add(current_date)
         
-        # Get attendance for this date
-        records = get_attendance_report(current_date, student_id)
+        summary['total_days'] += 1
+        status = record['Status']
         
-        # Add to summary
-        if records:
-            summary['total_days'] += 1
-            status = records[0]['Status']
-            
-            if status == 'present':
-                summary['present'] += 1
-            elif status == 'late':
-                summary['late'] += 1
-            else:
-                summary['absent'] += 1
-            
-            summary['dates'].append({
-                'date': current_date,
-                'status': status,
-                'time': records[0]['Time']
-            })
+        if status == 'present':
+            summary['present'] += 1
+        elif status == 'late':
+            summary['late'] += 1
+        else:
+            summary['absent'] += 1
         
-        # Move to next day
-        current_dt += datetime.timedelta(days=1)
+        summary['dates'].append({
+            'date': current_date,
+            'status': status,
+            'time': record['Time']
+        })
     
     # Calculate attendance percentage
     if summary['total_days'] > 0:
@@ -0,0 +1,143 @@
+import datetime
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.attendance import ATTENDANCE_DIR
+from utils.attendance_store import get_index
+
+COLUMNS = ['Date', 'ID', 'Name', 'Time', 'Status']
+
+
+class AttendanceAnalytics:
+    """
+    Class-wide attendance statistics computed in one vectorized pass
+
+    Each day is reduced once to the first record of every student seen that
+    day and cached together with the day's ingested row count, so extending
+    the date range (or a day gaining new rows) only loads the new days.
+
+    Args:
+        directory (str): Directory holding the daily attendance CSV files
+    """
+
+    def __init__(self, directory=ATTENDANCE_DIR):
+        self.index = get_index(directory)
+        self._days = {}
+        self._lock = threading.Lock()
+
+    def _first_records(self, start_date, end_date):
+        versions = self.index.day_versions(start_date, end_date)
+        with self._lock:
+            stale = [date for date, rows in versions.items() if self._days.get(date, (None,))[0] != rows]
+            if stale:
+                frame = pd.DataFrame(self.index.records_for_dates(stale), columns=COLUMNS)
+                # Records come back in write order, so the first one per student and day counts
+                frame = frame.drop_duplicates(['Date', 'ID'], keep='first')
+                for date, day in frame.groupby('Date', sort=False):
+                    self._days[date] = (versions[date], day)
+                for date in set(stale) - set(frame['Date']):
+                    self._days[date] = (versions[date], frame.iloc[:0])
+
+            days = [self._days[date][1] for date in sorted(versions)]
+        if not days:
+            return pd.DataFrame(columns=COLUMNS)
+        return pd.concat(days, ignore_index=True)
+
+    def summary(self, start_date=None, end_date=None):
+        """
+        Attendance of every student over a date range
+
+        Args:
+            start_date (str): Start date in YYYY-MM-DD format (default: 30 days ago)
+            end_date (str): End date in YYYY-MM-DD format (default: today)
+
+        Returns:
+            pd.DataFrame: One row per student ID with name, present, late,
+                absent, total_days, attendance_percentage (as in
+                get_student_attendance_summary), class_days (days with any
+                attendance), register_percentage (present + late over
+                class_days), first_seen and last_seen timestamps
+        """
+        if end_date is None:
+            end_date = datetime.datetime.now().strftime("%Y-%m-%d")
+        if start_date is None:
+            start_date = (datetime.datetime.now() - datetime.timedelta(days=30)).strftime("%Y-%m-%d")
+
+        first = self._first_records(start_date, end_date)
+        columns = ['name', 'present', 'late', 'absent', 'total_days', 'attendance_percentage',
+                   'class_days', 'register_percentage', 'first_seen', 'last_seen']
+        if first.empty:
+            return pd.DataFrame(columns=columns).rename_axis('student_id')
+
+        status = first['Status'].where(first['Status'].isin(['present', 'late']), 'absent')
+        counts = pd.crosstab(first['ID'], status).reindex(columns=['present', 'late', 'absent'], fill_value=0)
+        seen = pd.to_datetime(first['Date'] + ' ' + first['Time'], errors='coerce')
+        times = seen.groupby(first['ID']).agg(['min', 'max'])
+
+        result = counts.copy()
+        result.insert(0, 'name', first.groupby('ID')['Name'].last())
+        result['total_days'] = counts.sum(axis=1)
+        attended = counts['present'] + counts['late']
+        result['attendance_percentage'] = np.round(attended / result['total_days'] * 100, 2)
+        result['class_days'] = first['Date'].nunique()
+        result['register_percentage'] = np.round(attended / result['class_days'] * 100, 2)
+        result['first_seen'] = times['min']
+        result['last_seen'] = times['max']
+        result.index.name = 'student_id'
+        result.columns.name = None
+        return result[columns]
+
+    def defaulters(self, threshold=75.0, start_date=None, end_date=None, column='register_percentage'):
+        """
+        Students whose attendance is below a threshold
+
+        Args:
+            threshold (float): Minimum acceptable percentage
+            start_date (str): Start date in YYYY-MM-DD format
+            end_date (str): End date in YYYY-MM-DD format
+            column (str): Percentage column to compare
+
+        Returns:
+            pd.DataFrame: Rows of summary() below the threshold, lowest first
+        """
+        frame = self.summary(start_date, end_date)
+        return frame[frame[column] < threshold].sort_values(column)
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+
+def _shared():
+    global _analytics
+
+    with _analytics_lock:
+        if _analytics is None:
+            _analytics = AttendanceAnalytics()
+        return _analytics
+
+
+def get_class_attendance_summary(start_date=None, end_date=None):
+    """
+    Attendance summary of every student, see AttendanceAnalytics.summary
+
+    Args:
+        start_date (str): Start date in YYYY-MM-DD format (default: 30 days ago)
+        end_date (str): End date in YYYY-MM-DD format (default: today)
+
+    Returns:
+        pd.DataFrame: One row per student
+    """
+    return _shared().summary(start_date, end_date)
+
+
+def get_defaulters(threshold=75.0, start_date=None, end_date=None):
+    """
+    Students attending fewer than ``threshold`` percent of class days
+
+    Returns:
+        pd.DataFrame: Rows of the class summary below the threshold
+    """
+    return _shared().defaulters(threshold, start_date, end_date)
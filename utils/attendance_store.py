@@ -0,0 +1,195 @@
+import csv
+import io
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    date TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    student_id TEXT NOT NULL,
+    name TEXT,
+    time TEXT,
+    status TEXT,
+    PRIMARY KEY (date, seq)
+);
+CREATE INDEX IF NOT EXISTS records_student ON records (student_id, date);
+CREATE TABLE IF NOT EXISTS ingested (
+    date TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    rows INTEGER NOT NULL
+);
+"""
+
+
+class AttendanceIndex:
+    """
+    SQLite index over the daily ``attendance/YYYY-MM-DD.csv`` files
+
+    The CSV files stay the source of truth; the index ingests them
+    incrementally, remembering how many bytes of each file it has already
+    read, so appended rows cost one short read and untouched days cost one
+    stat. Queries by date or by (student, date range) are indexed range scans
+    instead of re-parsing every daily file.
+
+    Args:
+        directory (str): Directory holding the daily CSV files
+        db_path (str): Path of the index database (default: inside directory)
+    """
+
+    def __init__(self, directory, db_path=None):
+        self.directory = directory
+        self.db_path = db_path or os.path.join(directory, 'attendance.sqlite')
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def sync(self):
+        """Ingest whatever was appended to the CSV files since the last sync"""
+        with self._lock, closing(self._connect()) as conn, conn:
+            done = {date: (offset, rows) for date, offset, rows in conn.execute("SELECT date, offset, rows FROM ingested")}
+
+            filenames = [f for f in os.listdir(self.directory) if f.endswith('.csv')]
+            for filename in filenames:
+                date = filename[:-4]
+                path = os.path.join(self.directory, filename)
+                size = os.path.getsize(path)
+                offset, rows = done.get(date, (0, 0))
+                if size == offset:
+                    continue
+                if size < offset:
+                    # File was rewritten; ingest it again from the start
+                    conn.execute("DELETE FROM records WHERE date = ?", (date,))
+                    offset, rows = 0, 0
+                self._ingest(conn, date, path, offset, rows)
+
+            for date in set(done) - {f[:-4] for f in filenames}:
+                conn.execute("DELETE FROM records WHERE date = ?", (date,))
+                conn.execute("DELETE FROM ingested WHERE date = ?", (date,))
+
+    def _ingest(self, conn, date, path, offset, rows):
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+
+        # Leave a half-written last line for the next sync
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return
+        text = data[:end].decode('utf-8', errors='replace')
+
+        reader = csv.reader(io.StringIO(text, newline=''))
+        if offset == 0:
+            next(reader, None)
+
+        batch = []
+        for row in reader:
+            if len(row) < 4:
+                continue
+            batch.append((date, rows, row[0], row[1], row[2], row[3]))
+            rows += 1
+        conn.executemany(
+            "INSERT OR REPLACE INTO records (date, seq, student_id, name, time, status) VALUES (?, ?, ?, ?, ?, ?)",
+            batch,
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO ingested (date, offset, rows) VALUES (?, ?, ?)",
+            (date, offset + end, rows),
+        )
+
+    def records(self, date=None, student_id=None, start_date=None, end_date=None):
+        """
+        Attendance records, in the order they were written
+
+        Args:
+            date (str): Only this date (YYYY-MM-DD)
+            student_id (str): Only this student
+            start_date (str): First date of a range (inclusive)
+            end_date (str): Last date of a range (inclusive)
+
+        Returns:
+            list: Dicts with 'Date', 'ID', 'Name', 'Time' and 'Status'
+        """
+        self.sync()
+
+        clauses, params = [], []
+        if date is not None:
+            clauses.append("date = ?")
+            params.append(date)
+        if start_date is not None:
+            clauses.append("date >= ?")
+            params.append(start_date)
+        if end_date is not None:
+            clauses.append("date <= ?")
+            params.append(end_date)
+        if student_id is not None:
+            clauses.append("student_id = ?")
+            params.append(student_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT date, student_id, name, time, status FROM records {where} ORDER BY date, seq", params
+            ).fetchall()
+        return [
+            {'Date': date, 'ID': student_id, 'Name': name, 'Time': time, 'Status': status}
+            for date, student_id, name, time, status in rows
+        ]
+
+    def day_versions(self, start_date=None, end_date=None):
+        """
+        Number of ingested rows per date, which changes whenever a day's file grows
+
+        Returns:
+            dict: date -> row count
+        """
+        self.sync()
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT date, rows FROM ingested WHERE date >= ? AND date <= ?",
+                (start_date or '', end_date or '9999-99-99'),
+            ).fetchall()
+        return dict(rows)
+
+    def records_for_dates(self, dates):
+        """
+        Attendance records of several (not necessarily contiguous) dates
+
+        Returns:
+            list: Dicts with 'Date', 'ID', 'Name', 'Time' and 'Status'
+        """
+        dates = sorted(dates)
+        rows = []
+        with closing(self._connect()) as conn:
+            # Stay below SQLite's bound parameter limit
+            for i in range(0, len(dates), 500):
+                chunk = dates[i:i + 500]
+                rows.extend(conn.execute(
+                    f"SELECT date, student_id, name, time, status FROM records "
+                    f"WHERE date IN ({','.join('?' * len(chunk))}) ORDER BY date, seq",
+                    chunk,
+                ).fetchall())
+        return [
+            {'Date': date, 'ID': student_id, 'Name': name, 'Time': time, 'Status': status}
+            for date, student_id, name, time, status in rows
+        ]
+
+
+# Process-wide indexes, one per attendance directory
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(directory):
+    """Get the shared AttendanceIndex for a directory"""
+    key = os.path.abspath(directory)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = AttendanceIndex(directory)
+        return _indexes[key]
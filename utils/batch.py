@@ -0,0 +1,197 @@
+import collections
+import hashlib
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from utils.detection import FaceDetector
+from utils.gallery import _file_stamp
+from utils.metrics import metrics
+from utils.multicam import SharedGallery, attach_gallery
+from utils.quality import QualityGate
+
+# Per-process state of the recognition pool
+_worker = None
+
+
+def _init_worker(handle, options):
+    global _worker
+
+    import face_recognition as frg
+
+    cv2.setNumThreads(1)
+    gallery, shm = attach_gallery(handle, options['backend'], **options['search'])
+    quality = QualityGate(**options['quality']) if options['quality'] is not None else None
+    _worker = (frg, FaceDetector(**options['detection']), quality, gallery, shm)
+
+
+def _recognize_image(data, tolerance):
+    """Decode and recognize one uploaded image (runs in a worker process)"""
+    frg, detector, quality, gallery, _ = _worker
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Could not decode image")
+    image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    boxes = detector.detect(image)
+    passed = quality.filter(image, boxes) if quality is not None else [True] * len(boxes)
+    matches = iter(gallery.match(frg.face_encodings(image, [box for box, ok in zip(boxes, passed) if ok]),
+                                 tolerance) if len(gallery) else [])
+
+    faces = []
+    for box, ok in zip(boxes, passed):
+        row, distance = next(matches, (-1, float('inf'))) if ok else (-1, float('inf'))
+        if row >= 0:
+            faces.append((tuple(box), gallery.names[row], gallery.ids[row], distance))
+        else:
+            faces.append((tuple(box), 'Unknown', 'Unknown', distance))
+    return faces
+
+
+class UploadRecognizer:
+    """
+    Recognition of uploaded images across a process pool, with a result cache
+
+    Images are decoded and recognized in worker processes sharing one copy
+    of the gallery, and results are yielded as each image finishes. Finished
+    results are kept in an LRU cache keyed by the SHA-1 of the file contents
+    and the tolerance, so a Streamlit rerun or a repeated upload of the same
+    class photo is answered without recognizing it again. The pool and the
+    cache are replaced when the enrollment store changes.
+
+    Args:
+        paths (tuple): Files of the enrollment store backing the gallery
+        load (callable): Returns (keys, ids, names, encodings) for the gallery
+        workers (int): Worker processes (default: one per core)
+        cache_size (int): Results kept in the cache
+        backend (str): Search backend, see utils.search.make_index
+        search_params (dict): Search backend options
+        detection (dict): FaceDetector arguments
+        quality (dict): QualityGate arguments, None to encode every face
+    """
+
+    def __init__(self, paths, load, workers=None, cache_size=64, backend='exact', search_params=None,
+                 detection=None, quality=None):
+        self.paths = paths
+        self.load = load
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_size = cache_size
+        self.options = {
+            'backend': backend,
+            'search': search_params or {},
+            'detection': detection or {},
+            'quality': quality,
+        }
+        self._cache = collections.OrderedDict()
+        self._pool = None
+        self._gallery = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        stamp = _file_stamp(self.paths)
+        if self._pool is None or stamp != self._stamp:
+            self.close()
+            self._gallery = SharedGallery(*self.load())
+            # Spawned, not forked: the Streamlit process runs many threads
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context('spawn'),
+                                             initializer=_init_worker,
+                                             initargs=(self._gallery.handle, self.options))
+            self._stamp = stamp
+            self._cache.clear()
+        return self._pool
+
+    def _cache_get(self, key):
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+            return result
+
+    def _cache_put(self, key, result):
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def recognize(self, uploads, tolerance, annotate=None):
+        """
+        Recognize a batch of encoded images
+
+        Cached results come first, then the rest in the order they finish.
+
+        Args:
+            uploads (list): (name, encoded image bytes) per image
+            tolerance (float): Largest match distance accepted
+            annotate (callable): Draws faces onto an RGB image, e.g. app.draw_faces;
+                the annotated image is cached as a JPEG
+
+        Yields:
+            tuple: (name, faces, jpeg) where faces holds one (box, name, id,
+                distance) tuple per face and jpeg is the annotated image
+                (None without ``annotate``); on failure faces is the error message
+        """
+        with self._lock:
+            pool = self._get_pool()
+
+        futures = {}
+        for name, data in uploads:
+            key = (hashlib.sha1(data).hexdigest(), float(tolerance))
+            cached = self._cache_get(key)
+            if cached is not None:
+                metrics.inc('upload_cache_hits')
+                yield (name,) + cached
+                continue
+            metrics.inc('upload_cache_misses')
+            futures[pool.submit(_recognize_image, data, tolerance)] = (name, data, key)
+
+        for future in as_completed(futures):
+            name, data, key = futures[future]
+            try:
+                faces = future.result()
+            except Exception as e:
+                yield name, f"Error processing image: {e}", None
+                continue
+
+            jpeg = None
+            if annotate is not None:
+                image = cv2.cvtColor(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR),
+                                     cv2.COLOR_BGR2RGB)
+                annotate(image, faces)
+                jpeg = cv2.imencode('.jpg', cv2.cvtColor(image, cv2.COLOR_RGB2BGR),
+                                    [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+            self._cache_put(key, (faces, jpeg))
+            yield name, faces, jpeg
+
+    def close(self):
+        """Shut the pool down and release the shared gallery"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._gallery is not None:
+            self._gallery.close()
+            self._gallery = None
+
+
+# Process-wide recognizer, so the pool and cache survive Streamlit reruns
+_recognizer = None
+_recognizer_key = None
+_recognizer_lock = threading.Lock()
+
+
+def get_upload_recognizer(paths, load, **params):
+    """Get the shared UploadRecognizer, replacing it when its settings change"""
+    global _recognizer, _recognizer_key
+
+    key = (tuple(paths), repr(sorted(params.items())))
+    with _recognizer_lock:
+        if _recognizer is None or _recognizer_key != key:
+            if _recognizer is not None:
+                _recognizer.close()
+            _recognizer = UploadRecognizer(paths, load, **params)
+            _recognizer_key = key
+        return _recognizer
@@ -0,0 +1,180 @@
+import hashlib
+import multiprocessing as mp
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def parse_filename(filename):
+    """
+    Split a dataset file name of the form ``<id>_<first>_<last>.jpg``
+
+    Returns:
+        tuple: (person_id, person_name)
+    """
+    image_name = filename.split('.')[0]
+    parsed_name = image_name.split('_')
+    return parsed_name[0], ' '.join(parsed_name[1:])
+
+
+def file_hash(path):
+    """SHA-1 of a file's contents"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_cache(cache_path):
+    """Load the per-file encoding cache, or an empty one"""
+    try:
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        return {}
+
+
+def save_cache(cache_path, cache):
+    """Write the per-file encoding cache atomically"""
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(cache, f)
+    os.replace(tmp_path, cache_path)
+
+
+def _encode_file(path, encode=True):
+    """
+    Load one dataset image and optionally encode it (runs in a worker process)
+
+    Returns:
+        tuple: (image, encoding or None, content hash, error message or None)
+    """
+    import face_recognition as frg
+
+    try:
+        img = frg.load_image_file(path)
+        encoding = None
+        if encode:
+            face_encodings = frg.face_encodings(img)
+            if len(face_encodings) == 0:
+                return img, None, file_hash(path), None
+            encoding = face_encodings[0]
+        return img, encoding, file_hash(path), None
+    except Exception as e:
+        return None, None, None, str(e)
+
+
+def build_database(dataset_dir, cache_path, previous=None, workers=None, next_idx=None):
+    """
+    Build the enrollment database from the images in a directory
+
+    Each file's encoding is cached in a sidecar keyed by size and mtime,
+    with the content hash as a fallback when only the mtime changed. Only
+    new or changed images are encoded, spread across a process pool;
+    unchanged entries of the previous database are reused as they are and
+    entries for deleted files are dropped. Files already in the previous
+    database keep their index; new files get fresh indexes from
+    ``next_idx``, so an index is never reused for another student.
+
+    Args:
+        dataset_dir (str): Directory of ``<id>_<name>.jpg`` images
+        cache_path (str): Path of the encoding cache sidecar
+        previous (dict): Previously built database to reuse entries from
+        workers (int): Worker processes (default: all cores)
+        next_idx (int): First never-used index (default: one past the previous database)
+
+    Returns:
+        tuple: (database dict, stats dict, list of (filename, error) tuples)
+    """
+    cache = load_cache(cache_path)
+    previous_by_file = {
+        entry['file']: entry for entry in (previous or {}).values() if 'file' in entry
+    }
+    idx_of_file = {entry['file']: idx for idx, entry in (previous or {}).items() if 'file' in entry}
+    if next_idx is None:
+        next_idx = max(previous or {}, default=-1) + 1
+
+    files = sorted(f for f in os.listdir(dataset_dir) if f.endswith(IMAGE_EXTENSIONS))
+    new_cache = {}
+    entries = {}
+    jobs = {}
+    stats = {'total': len(files), 'reused': 0, 'encoded': 0, 'removed': 0, 'failed': 0}
+    errors = []
+
+    for filename in files:
+        path = os.path.join(dataset_dir, filename)
+        st = os.stat(path)
+        cached = cache.get(filename)
+        if cached is not None and (cached['size'], cached['mtime']) != (st.st_size, st.st_mtime_ns):
+            # Touched but possibly identical: fall back to the content hash
+            if cached['hash'] == file_hash(path):
+                cached = dict(cached, size=st.st_size, mtime=st.st_mtime_ns)
+            else:
+                cached = None
+
+        if cached is None:
+            jobs[filename] = (path, True, st)
+            continue
+
+        new_cache[filename] = cached
+        if cached['encoding'] is None:
+            # Known image without a face; nothing to enroll
+            stats['reused'] += 1
+        elif filename in previous_by_file:
+            entries[filename] = previous_by_file[filename]
+            stats['reused'] += 1
+        else:
+            # Encoding cached but image not in the previous database
+            jobs[filename] = (path, False, st)
+
+    if jobs:
+        # Spawned, not forked: the app and the service call this from multithreaded processes
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn')) as pool:
+            futures = {
+                pool.submit(_encode_file, path, encode): filename
+                for filename, (path, encode, _) in jobs.items()
+            }
+            for future in as_completed(futures):
+                filename = futures[future]
+                _, encode, st = jobs[filename]
+                img, encoding, content_hash, error = future.result()
+                if error is not None:
+                    stats['failed'] += 1
+                    errors.append((filename, error))
+                    continue
+
+                if encode:
+                    stats['encoded'] += 1
+                    new_cache[filename] = {
+                        'size': st.st_size,
+                        'mtime': st.st_mtime_ns,
+                        'hash': content_hash,
+                        'encoding': encoding,
+                    }
+                else:
+                    stats['reused'] += 1
+                    encoding = new_cache[filename]['encoding']
+
+                if encoding is not None:
+                    person_id, person_name = parse_filename(filename)
+                    entries[filename] = {
+                        'image': img,
+                        'id': person_id,
+                        'name': person_name,
+                        'encoding': encoding,
+                        'file': filename,
+                    }
+
+    stats['removed'] = len(set(cache) - set(files))
+    save_cache(cache_path, new_cache)
+
+    database = {}
+    for filename in sorted(entries):
+        idx = idx_of_file.get(filename)
+        if idx is None:
+            idx, next_idx = next_idx, next_idx + 1
+        database[idx] = entries[filename]
+    return database, stats, errors
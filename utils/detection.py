@@ -0,0 +1,101 @@
+import threading
+
+import cv2
+
+MODELS = ('hog', 'cnn')
+
+
+class FaceDetector:
+    """
+    Face detection on a downscaled copy of the frame
+
+    Boxes are found on the small copy and mapped back to full resolution, so
+    encoding and drawing still use the original frame. In adaptive mode the
+    scale drops whenever recent frames overrun ``frame_budget_ms`` and creeps
+    back up once there is headroom again.
+
+    Args:
+        scale (float): Resize factor applied before detection
+        upsample (int): Number of times dlib upsamples the image
+        model (str): 'hog' (CPU) or 'cnn' (slow without a GPU)
+        min_face_size (int): Drop boxes smaller than this, in full-res pixels
+        adaptive (bool): Adjust the scale to keep frames within the budget
+        frame_budget_ms (float): Target time per frame in adaptive mode
+        min_scale (float): Lowest scale adaptive mode may pick
+        max_scale (float): Highest scale adaptive mode may pick
+    """
+
+    def __init__(self, scale=1.0, upsample=1, model='hog', min_face_size=0,
+                 adaptive=False, frame_budget_ms=150, min_scale=0.25, max_scale=1.0):
+        if model not in MODELS:
+            raise ValueError(f"Unknown detection model '{model}', expected one of {MODELS}")
+        self.scale = float(scale)
+        self.upsample = int(upsample)
+        self.model = model
+        self.min_face_size = int(min_face_size)
+        self.adaptive = adaptive
+        self.frame_budget = frame_budget_ms / 1000.0
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self._frame_time = None
+
+    def detect(self, image):
+        """
+        Find face boxes in an image
+
+        Args:
+            image (np.ndarray): Full resolution frame
+
+        Returns:
+            list: (top, right, bottom, left) boxes in full-res coordinates
+        """
+        import face_recognition as frg
+
+        scale = self.scale
+        small = image
+        if scale != 1.0:
+            small = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        height, width = image.shape[:2]
+        boxes = []
+        for top, right, bottom, left in frg.face_locations(small, self.upsample, self.model):
+            top, bottom = max(int(top / scale), 0), min(int(bottom / scale), height)
+            left, right = max(int(left / scale), 0), min(int(right / scale), width)
+            if min(bottom - top, right - left) < self.min_face_size:
+                continue
+            boxes.append((top, right, bottom, left))
+        return boxes
+
+    def observe(self, frame_seconds):
+        """
+        Feed back the total time of the last frame (adaptive mode only)
+
+        Args:
+            frame_seconds (float): Wall time spent on the frame
+        """
+        if not self.adaptive:
+            return
+
+        if self._frame_time is None:
+            self._frame_time = frame_seconds
+        else:
+            self._frame_time = 0.8 * self._frame_time + 0.2 * frame_seconds
+
+        if self._frame_time > self.frame_budget:
+            self.scale = max(self.min_scale, round(self.scale * 0.85, 3))
+        elif self._frame_time < 0.6 * self.frame_budget:
+            self.scale = min(self.max_scale, round(self.scale * 1.05, 3))
+
+
+# Process-wide detectors, so adaptive state survives Streamlit reruns
+_detectors = {}
+_detectors_lock = threading.Lock()
+
+
+def get_detector(**params):
+    """Get the shared FaceDetector for a set of FaceDetector arguments"""
+    key = tuple(sorted(params.items()))
+    with _detectors_lock:
+        if key not in _detectors:
+            _detectors[key] = FaceDetector(**params)
+        return _detectors[key]
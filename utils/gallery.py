@@ -0,0 +1,189 @@
+import os
+import threading
+
+import numpy as np
+
+from utils.search import ExactIndex, make_index
+
+ENCODING_DIM = 128
+
+
+class Gallery:
+    """
+    Enrolled face encodings held by a search index
+
+    Row ``i`` of the index belongs to ``ids[i]`` / ``names[i]`` and was read
+    from ``keys[i]`` of the enrollment database, so matches never depend on
+    the database keys being contiguous. Removed entries leave a ``None`` row
+    behind so row numbers stay stable for the search index. The encodings
+    are handed to the index as they are, so a memory-mapped matrix from the
+    enrollment store is not copied into RAM here.
+    """
+
+    def __init__(self, keys=(), ids=(), names=(), encodings=None, index=None):
+        self.keys = list(keys)
+        self.ids = list(ids)
+        self.names = list(names)
+        if encodings is None or len(self.keys) == 0:
+            encodings = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        encodings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        self._rows = {key: row for row, key in enumerate(self.keys)}
+        self.index = index if index is not None else ExactIndex()
+        self.index.build(np.arange(len(self.keys)), encodings)
+
+    @classmethod
+    def from_database(cls, database, index=None):
+        """
+        Build a gallery from an enrollment database dict
+
+        Args:
+            database (dict): Mapping of key -> {'id', 'name', 'encoding', ...}
+            index: Empty search index to fill (default: exact brute force)
+
+        Returns:
+            Gallery: Gallery with one row per database entry
+        """
+        keys = list(database.keys())
+        ids = [database[key]['id'] for key in keys]
+        names = [database[key]['name'] for key in keys]
+        encodings = np.array([database[key]['encoding'] for key in keys], dtype=np.float32)
+        return cls(keys, ids, names, encodings, index=index)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def copy(self):
+        """Copy that can be changed with add / remove while this one is still searched"""
+        other = Gallery.__new__(Gallery)
+        other.keys = list(self.keys)
+        other.ids = list(self.ids)
+        other.names = list(self.names)
+        other._rows = dict(self._rows)
+        other.index = self.index.copy()
+        return other
+
+    def add(self, key, id, name, encoding):
+        """Add or replace the entry stored under a database key"""
+        if key in self._rows:
+            self.remove(key)
+
+        row = len(self.keys)
+        encoding = np.asarray(encoding, dtype=np.float32).reshape(1, ENCODING_DIM)
+        self.keys.append(key)
+        self.ids.append(id)
+        self.names.append(name)
+        self._rows[key] = row
+        self.index.add([row], encoding)
+
+    def remove(self, key):
+        """Remove the entry stored under a database key, if any"""
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        self.keys[row] = None
+        self.ids[row] = None
+        self.names[row] = None
+        self.index.remove([row])
+
+    def match(self, face_encodings, tolerance):
+        """
+        Find the nearest gallery row for each query encoding
+
+        Args:
+            face_encodings (array-like): M x 128 query encodings
+            tolerance (float): Maximum distance accepted as a match
+
+        Returns:
+            list: One (row, distance) tuple per query; row is -1 when the
+                nearest row is farther than the tolerance
+        """
+        if len(face_encodings) == 0:
+            return []
+        if len(self) == 0:
+            return [(-1, float('inf'))] * len(face_encodings)
+
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        rows, dist = self.index.search(queries, k=1)
+        return [
+            (int(row) if d <= tolerance else -1, float(d))
+            for row, d in zip(rows[:, 0], dist[:, 0])
+        ]
+
+
+# Process-wide gallery shared by every Streamlit rerun and session
+_gallery = None
+_gallery_stamp = None
+_gallery_lock = threading.Lock()
+
+
+def _file_stamp(paths):
+    stamp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamp.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append((path, None, None))
+    return tuple(stamp)
+
+
+def get_gallery(paths, load, backend='exact', **params):
+    """
+    Get the shared gallery, rebuilding it only when the store has changed
+
+    Args:
+        paths (tuple): Files of the enrollment store backing the gallery
+        load (callable): Returns (keys, ids, names, encodings) for the gallery
+        backend (str): Search backend, see utils.search.make_index
+        **params: Search backend options
+
+    Returns:
+        Gallery: The process-wide gallery
+    """
+    global _gallery, _gallery_stamp
+
+    stamp = (_file_stamp(paths), backend, tuple(sorted(params.items())))
+    with _gallery_lock:
+        if _gallery is None or _gallery_stamp != stamp:
+            _gallery = Gallery(*load(), index=make_index(backend, **params))
+            _gallery_stamp = stamp
+        return _gallery
+
+
+def update_gallery(paths, key, id=None, name=None, encoding=None):
+    """
+    Apply one enrollment change to the shared gallery without rebuilding it
+
+    Passing an encoding adds or replaces the entry under ``key``; passing none
+    removes it. Call this right after the change has been written to the store.
+    The change is made to a copy that then replaces the shared gallery, so
+    threads still matching against the previous one never see it half done.
+
+    Args:
+        paths (tuple): Files of the enrollment store backing the gallery
+        key: Database key of the changed entry
+        id (str): Student ID
+        name (str): Student name
+        encoding (array-like): 128-d face encoding, or None to remove
+    """
+    global _gallery, _gallery_stamp
+
+    with _gallery_lock:
+        if _gallery is None:
+            return
+        gallery = _gallery.copy()
+        if encoding is None:
+            gallery.remove(key)
+        else:
+            gallery.add(key, id, name, encoding)
+        _gallery = gallery
+        _gallery_stamp = (_file_stamp(paths),) + _gallery_stamp[1:]
+
+
+def invalidate_gallery():
+    """Drop the shared gallery so the next lookup rebuilds it"""
+    global _gallery, _gallery_stamp
+
+    with _gallery_lock:
+        _gallery = None
+        _gallery_stamp = None
@@ -0,0 +1,219 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from utils.metrics import metrics
+
+BOUNDARY = 'frame'
+
+
+class MJPEGStream:
+    """
+    Latest annotated frame served as a multipart JPEG (MJPEG) stream
+
+    Frames are JPEG-encoded once, at a chosen quality and width, by whoever
+    publishes them, and every connected browser is sent the newest frame
+    whenever it is ready for one. A client that falls behind never builds a
+    backlog: frames published while it was still receiving are skipped.
+    Nothing is encoded while no client is connected. Closing the stream
+    when capture ends ends every client's response, until it is reopened.
+
+    Args:
+        host (str): Interface to bind the endpoint to
+        port (int): Port of http://host:port/stream.mjpg
+        quality (int): JPEG quality (1-100)
+        width (int): Width frames are scaled down to, None to keep them as they are
+    """
+
+    def __init__(self, host='127.0.0.1', port=8502, quality=70, width=None):
+        self.host = host
+        self.port = port
+        self.quality = quality
+        self.width = width
+        self.clients = 0
+        self.closed = False
+        self._jpeg = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._server = None
+
+    @property
+    def url(self):
+        host = 'localhost' if self.host in ('', '0.0.0.0') else self.host
+        return f"http://{host}:{self.port}/stream.mjpg"
+
+    def encode(self, frame):
+        """
+        JPEG-encode a BGR frame for the stream
+
+        Returns:
+            bytes: The JPEG, or None when no client is watching
+        """
+        if not self.clients:
+            return None
+        height, width = frame.shape[:2]
+        if self.width and width > self.width:
+            frame = cv2.resize(frame, (self.width, int(height * self.width / width)), interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+        return jpeg.tobytes() if ok else None
+
+    def publish(self, jpeg):
+        """Make an encoded frame the newest one; a None frame is ignored"""
+        if jpeg is None:
+            return
+        with self._cond:
+            self._jpeg = jpeg
+            self._seq += 1
+            self._cond.notify_all()
+
+    def open(self):
+        """Accept clients again after close()"""
+        with self._cond:
+            self.closed = False
+
+    def close(self):
+        """End every client's stream, e.g. when capture stops"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def _frames(self):
+        """Yield the newest frame each time one newer than the last is available, until closed"""
+        sent = self._seq
+        while True:
+            with self._cond:
+                if not self._cond.wait_for(lambda: self.closed or self._seq > sent, timeout=5.0):
+                    continue
+                if self.closed:
+                    return
+                skipped = self._seq - sent - 1
+                sent, jpeg = self._seq, self._jpeg
+            if skipped > 0:
+                metrics.inc('stream_skipped_frames', skipped)
+            yield jpeg
+
+    def start(self):
+        """Start serving in a background thread"""
+        stream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0].rstrip('/') != '/stream.mjpg':
+                    self.send_error(404)
+                    return
+                if stream.closed:
+                    self.send_error(503, "Live view is not running")
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                with stream._cond:
+                    stream.clients += 1
+                try:
+                    for jpeg in stream._frames():
+                        self.wfile.write(
+                            f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode()
+                        )
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b"\r\n")
+                        metrics.tick('stream_frames')
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with stream._cond:
+                        stream.clients -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+
+class OverlayCache:
+    """
+    Face labels rendered once and pasted onto every following frame
+
+    The name and distance text of each label (name, ID, shown distance) is
+    drawn once onto a small patch, the costly part of drawing a face. Frames
+    showing the same label paste its drawn pixels above the face's current
+    box, wherever the box has moved, so text rendering happens only for
+    labels that changed since the previous frame. Boxes themselves are
+    cheap to draw and are drawn on every frame.
+
+    Args:
+        draw_box (callable): Draws the box of one face onto an image, e.g. app.draw_box
+        draw_label (callable): Draws the label of one face above its box, e.g. app.draw_label
+        margin (int): Pixels above a box kept for its two label lines
+    """
+
+    def __init__(self, draw_box, draw_label, margin=56):
+        self.draw_box = draw_box
+        self.draw_label = draw_label
+        self.margin = margin
+        self.redrawn = 0
+        self._patches = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(face):
+        _, name, id, distance = face
+        # Unknown faces show no distance, so any distance shares their label
+        return name, id, None if id == 'Unknown' else round(float(distance), 2)
+
+    def _render(self, face):
+        name, id, distance = self._key(face)
+        width = max(cv2.getTextSize(str(text), cv2.FONT_HERSHEY_SIMPLEX, 0.75, 2)[0][0]
+                    for text in (name, distance))
+        canvas = np.zeros((self.margin, width + 4, 3), dtype=np.uint8)
+        # Label of a box whose top-left corner sits just below the canvas, 2 pixels in
+        self.draw_label(canvas, ((self.margin, width + 2, self.margin, 2),) + tuple(face[1:]))
+        # Keep solid strokes only; faint anti-aliased edges were blended with black
+        mask = (canvas.max(axis=2) > 96).astype(np.uint8)
+        return canvas, mask
+
+    def apply(self, image, faces):
+        """Draw faces onto an image, reusing the label patches of unchanged labels"""
+        keys = [self._key(face) for face in faces]
+        with self._lock:
+            patches = {key: self._patches.get(key) for key in keys}
+        for key, face in zip(keys, faces):
+            if patches[key] is None:
+                patches[key] = self._render(face)
+                self.redrawn += 1
+        with self._lock:
+            # Labels no longer shown are forgotten
+            self._patches = patches
+
+        height, width = image.shape[:2]
+        for key, face in zip(keys, faces):
+            self.draw_box(image, face)
+            canvas, mask = patches[key]
+            top, left = face[0][0] - self.margin, face[0][3] - 2
+            y0, x0 = max(top, 0), max(left, 0)
+            y1, x1 = min(top + canvas.shape[0], height), min(left + canvas.shape[1], width)
+            if y1 <= y0 or x1 <= x0:
+                continue
+            cv2.copyTo(canvas[y0 - top:y1 - top, x0 - left:x1 - left], mask[y0 - top:y1 - top, x0 - left:x1 - left],
+                       image[y0:y1, x0:x1])
+
+
+# Process-wide streams, one per port, so the endpoint survives Streamlit reruns
+_streams = {}
+_streams_lock = threading.Lock()
+
+
+def get_stream(host='127.0.0.1', port=8502, quality=70, width=None):
+    """Get the running MJPEGStream on a port, starting it on first use and reopening it if closed"""
+    with _streams_lock:
+        if port not in _streams:
+            _streams[port] = MJPEGStream(host, port, quality, width).start()
+        stream = _streams[port]
+    stream.quality, stream.width = quality, width
+    stream.open()
+    return stream
@@ -0,0 +1,235 @@
+import bisect
+import collections
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from utils.pipeline import FPSMeter
+
+# Prometheus histogram bucket bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class RollingHistogram:
+    """
+    Latency samples of one stage
+
+    The last ``window`` samples are kept for percentiles of recent
+    behaviour; cumulative bucket counts, count and sum are kept for the
+    Prometheus export. Observing a sample is a deque append and a bisect.
+
+    Args:
+        window (int): Number of recent samples used for percentiles
+        buckets (tuple): Upper bounds of the cumulative buckets in seconds
+    """
+
+    def __init__(self, window=512, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._recent = collections.deque(maxlen=window)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._recent.append(value)
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def percentiles(self, qs=(50, 95)):
+        """Percentiles of the recent window, or None when nothing was observed"""
+        with self._lock:
+            recent = np.array(self._recent)
+        if not len(recent):
+            return None
+        return np.percentile(recent, qs)
+
+    def cumulative(self):
+        """(bound, count) pairs for Prometheus, ending with +Inf"""
+        with self._lock:
+            counts = list(self._counts)
+        totals = np.cumsum(counts)
+        return list(zip(self.buckets + (float('inf'),), totals.tolist()))
+
+
+class Metrics:
+    """
+    Registry of stage timings, frame rates, gauges and counters
+
+    Args:
+        window (int): Samples kept per stage for percentiles
+        enabled (bool): When False, timers and observations are no-ops
+    """
+
+    def __init__(self, window=512, enabled=True):
+        self.window = window
+        self.enabled = enabled
+        self.histograms = {}
+        self.rates = {}
+        self.gauges = {}
+        self.counters = collections.Counter()
+        self._lock = threading.Lock()
+
+    def _histogram(self, stage):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, RollingHistogram(self.window))
+        return histogram
+
+    def observe(self, stage, seconds):
+        if self.enabled:
+            self._histogram(stage).observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the body of a with block as one sample of ``stage``"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._histogram(stage).observe(time.perf_counter() - start)
+
+    def tick(self, name):
+        """Count one event of a rate such as processed frames"""
+        if not self.enabled:
+            return
+        meter = self.rates.get(name)
+        if meter is None:
+            with self._lock:
+                meter = self.rates.setdefault(name, FPSMeter())
+        meter.tick()
+
+    def set(self, name, value):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def inc(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] += amount
+
+    def snapshot(self):
+        """
+        Current view of every metric
+
+        Returns:
+            dict: 'stages' (count, mean, p50 and p95 in ms per stage),
+                'fps', 'gauges' and 'counters'
+        """
+        stages = {}
+        for stage, histogram in list(self.histograms.items()):
+            percentiles = histogram.percentiles()
+            if percentiles is None:
+                continue
+            stages[stage] = {
+                'count': histogram.count,
+                'mean_ms': round(histogram.sum / histogram.count * 1000, 2),
+                'p50_ms': round(float(percentiles[0]) * 1000, 2),
+                'p95_ms': round(float(percentiles[1]) * 1000, 2),
+            }
+        return {
+            'stages': stages,
+            'fps': {name: round(meter.fps, 1) for name, meter in list(self.rates.items())},
+            'gauges': dict(self.gauges),
+            'counters': dict(self.counters),
+        }
+
+    def prometheus(self, prefix='face_attendance'):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent in each recognition and enrollment stage",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(self.histograms.items()):
+            for bound, count in histogram.cumulative():
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {count}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        if self.rates:
+            lines += [f"# HELP {prefix}_fps Events per second over the last few seconds", f"# TYPE {prefix}_fps gauge"]
+            for name, meter in sorted(self.rates.items()):
+                lines.append(f'{prefix}_fps{{name="{name}"}} {meter.fps:.3f}')
+        for name, value in sorted(self.gauges.items()):
+            lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+        for name, value in sorted(self.counters.items()):
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Atomically write the Prometheus text to a file, e.g. for node_exporter's textfile collector"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, path)
+
+
+# Process-wide registry shared by the app, service and workers
+metrics = Metrics()
+
+_exporter_lock = threading.Lock()
+_exporter_started = False
+
+
+def start_exporter(path=None, port=None, host='127.0.0.1', interval=15.0):
+    """
+    Export the shared metrics once per process
+
+    Streamlit reruns the app script on every interaction, so repeated calls
+    are ignored after the first.
+
+    Args:
+        path (str): File rewritten with the Prometheus text every ``interval`` seconds
+        port (int): Serve the Prometheus text on http://host:port/metrics
+        host (str): Interface to bind the endpoint to
+        interval (float): Seconds between file writes
+    """
+    global _exporter_started
+
+    with _exporter_lock:
+        if _exporter_started or (path is None and port is None):
+            return
+        _exporter_started = True
+
+    if path is not None:
+        def write_loop():
+            while True:
+                try:
+                    metrics.write_prometheus(path)
+                except OSError:
+                    pass
+                time.sleep(interval)
+
+        threading.Thread(target=write_loop, daemon=True).start()
+
+    if port is not None:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
@@ -0,0 +1,140 @@
+import collections
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from utils.tracking import iou
+
+METHODS = ('diff', 'mog2')
+
+
+def _merge(boxes):
+    """Merge overlapping boxes until no two overlap"""
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                if iou(boxes[i], boxes[j]) > 0:
+                    a, b = boxes[i], boxes.pop(j)
+                    boxes[i] = (min(a[0], b[0]), max(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3]))
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+class MotionGate:
+    """
+    Cheap change detection that decides whether a frame needs recognition
+
+    Frames are compared on a small blurred grayscale copy, either against a
+    slowly updated running-average background ('diff') or with OpenCV's MOG2
+    background subtractor ('mog2'). When less than ``min_area`` of the frame
+    changed the frame is gated and the caller reuses its last result; when
+    a few regions changed, their padded boxes are returned so detection can
+    run on those crops only. A full frame is still processed at least every
+    ``max_idle`` seconds to pick up slow changes.
+
+    Args:
+        method (str): 'diff' or 'mog2'
+        width (int): Width of the comparison copy in pixels
+        threshold (int): Gray level difference that counts as changed ('diff' only)
+        min_area (float): Changed fraction of the frame that wakes recognition up
+        full_frame_area (float): Changed fraction above which the whole frame is processed
+        padding (float): Region padding, as a fraction of the region size
+        max_idle (float): Longest time without a full frame, in seconds
+        learning_rate (float): Background update rate per frame ('diff' only)
+    """
+
+    def __init__(self, method='diff', width=160, threshold=25, min_area=0.002, full_frame_area=0.3,
+                 padding=0.25, max_idle=30.0, learning_rate=0.05):
+        if method not in METHODS:
+            raise ValueError(f"Unknown motion method '{method}', expected one of {METHODS}")
+        self.method = method
+        self.width = width
+        self.threshold = threshold
+        self.min_area = min_area
+        self.full_frame_area = full_frame_area
+        self.padding = padding
+        self.max_idle = max_idle
+        self.learning_rate = learning_rate
+
+        self.idle = False
+        self.last_faces = None
+        self.hourly = collections.OrderedDict()
+        self._background = None
+        self._subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False) if method == 'mog2' else None
+        self._last_full = None
+        self._lock = threading.Lock()
+
+    def _count(self, processed):
+        hour = time.strftime("%Y-%m-%d %H:00")
+        counts = self.hourly.setdefault(hour, {'processed': 0, 'gated': 0})
+        counts['processed' if processed else 'gated'] += 1
+        while len(self.hourly) > 48:
+            self.hourly.popitem(last=False)
+
+    def _mask(self, gray):
+        if self._subtractor is not None:
+            return self._subtractor.apply(gray)
+        if self._background is None:
+            self._background = gray.astype(np.float32)
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        cv2.accumulateWeighted(gray, self._background, self.learning_rate)
+        return cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)[1]
+
+    def regions(self, frame):
+        """
+        Check a frame for changes
+
+        Args:
+            frame (np.ndarray): Full resolution frame
+
+        Returns:
+            None to process the whole frame, an empty list when nothing
+            changed, otherwise (top, right, bottom, left) boxes of the
+            changed regions in full resolution coordinates
+        """
+        height, width = frame.shape[:2]
+        scale = self.width / float(width)
+        small = cv2.resize(frame, (self.width, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        with self._lock:
+            mask = cv2.dilate(self._mask(gray), None, iterations=2)
+            changed = cv2.countNonZero(mask) / float(mask.size)
+
+            now = time.perf_counter()
+            if self._last_full is None or now - self._last_full >= self.max_idle or changed >= self.full_frame_area:
+                self._last_full = now
+                self.idle = False
+                self._count(True)
+                return None
+            if changed < self.min_area:
+                self.idle = True
+                self._count(False)
+                return []
+            self.idle = False
+            self._count(True)
+
+        boxes = []
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            pad_x, pad_y = w * self.padding, h * self.padding
+            boxes.append((
+                max(int((y - pad_y) / scale), 0),
+                min(int((x + w + pad_x) / scale), width),
+                min(int((y + h + pad_y) / scale), height),
+                max(int((x - pad_x) / scale), 0),
+            ))
+        return _merge(boxes)
+
+    def stats(self):
+        """Processed and gated frame counts per hour, oldest first"""
+        with self._lock:
+            return {hour: dict(counts) for hour, counts in self.hourly.items()}
@@ -0,0 +1,396 @@
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+import yaml
+
+from utils.detection import FaceDetector
+from utils.gallery import ENCODING_DIM, Gallery, _file_stamp
+from utils.search import make_index, search_config
+
+
+class SharedGallery:
+    """
+    Gallery encodings published once in shared memory
+
+    Worker processes attach to the block by name and build their search
+    index over a view of it, so an N x 128 matrix exists once in RAM however
+    many cameras are running. Only the small key/ID/name lists are pickled.
+
+    Args:
+        keys (list): Database keys of the gallery rows
+        ids (list): Student IDs of the gallery rows
+        names (list): Student names of the gallery rows
+        encodings (np.ndarray): N x 128 face encodings
+    """
+
+    def __init__(self, keys, ids, names, encodings):
+        encodings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(encodings.nbytes, 1))
+        np.ndarray(encodings.shape, dtype=np.float32, buffer=self._shm.buf)[:] = encodings
+        self.handle = {
+            'name': self._shm.name,
+            'shape': encodings.shape,
+            'keys': list(keys),
+            'ids': list(ids),
+            'names': list(names),
+        }
+
+    def close(self):
+        """Release the block; processes still attached keep their mapping"""
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def attach_gallery(handle, backend='exact', **params):
+    """
+    Build a Gallery over a SharedGallery published by another process
+
+    Args:
+        handle (dict): SharedGallery.handle
+        backend (str): Search backend, see utils.search.make_index
+        **params: Search backend options
+
+    Returns:
+        tuple: (Gallery, SharedMemory); close the latter once the gallery is dropped
+    """
+    shm = shared_memory.SharedMemory(name=handle['name'])
+    encodings = np.ndarray(handle['shape'], dtype=np.float32, buffer=shm.buf)
+    gallery = Gallery(handle['keys'], handle['ids'], handle['names'], encodings,
+                      index=make_index(backend, **params))
+    return gallery, shm
+
+
+def _release(shm):
+    try:
+        shm.close()
+    except BufferError:
+        # A view is still alive somewhere; the mapping goes away with the process
+        pass
+
+
+def _camera_worker(name, source, handle, options, results, control, stop):
+    """Recognize faces from one capture source until it ends or ``stop`` is set"""
+    import face_recognition as frg
+
+    # One core per camera: let the processes, not the libraries, use the cores
+    cv2.setNumThreads(1)
+    detector = FaceDetector(**options['detection'])
+    gallery, shm, current = None, None, None
+    cam = cv2.VideoCapture(source)
+    frame_no = 0
+    try:
+        while not stop.is_set():
+            # Switch to the newest gallery published since the last frame
+            try:
+                while True:
+                    handle = control.get_nowait()
+            except queue.Empty:
+                pass
+            if handle is not current:
+                gallery = None
+                if shm is not None:
+                    _release(shm)
+                    shm = None
+                try:
+                    gallery, shm = attach_gallery(handle, options['backend'], **options['search'])
+                except FileNotFoundError:
+                    # Replaced before this worker attached; the new handle is on its way
+                    try:
+                        handle = control.get(timeout=1.0)
+                    except queue.Empty:
+                        pass
+                    continue
+                current = handle
+
+            ret, frame = cam.read()
+            if not ret:
+                break
+            frame_no += 1
+            if frame_no % options['frame_step']:
+                continue
+
+            start = time.perf_counter()
+            image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            boxes = detector.detect(image)
+            faces = []
+            if boxes and len(gallery):
+                encodings = frg.face_encodings(image, boxes)
+                for row, distance in gallery.match(encodings, options['tolerance']):
+                    if row >= 0:
+                        faces.append((gallery.ids[row], gallery.names[row], float(distance)))
+            results.put((name, frame_no, time.perf_counter() - start, len(boxes), faces))
+    except Exception as e:
+        results.put((name, -1, 0.0, 0, str(e)))
+    finally:
+        cam.release()
+        gallery = None
+        if shm is not None:
+            _release(shm)
+        results.put((name, None, 0.0, 0, None))
+
+
+class MultiCameraRecognizer:
+    """
+    Recognition over several capture sources with one worker process each
+
+    The gallery is published once through shared memory and republished
+    whenever the enrollment store changes. Workers send recognized students
+    back over one queue, and the parent feeds them into a single attendance
+    sink (e.g. AttendanceWriter.mark), so deduplication and file writes stay
+    in one place however many cameras are running. With a vote aggregator
+    only students it confirms reach the sink, once each.
+
+    Args:
+        sources (dict): Camera name -> device index, video file or stream URL
+        paths (tuple): Files of the enrollment store backing the gallery
+        load (callable): Returns (keys, ids, names, encodings) for the gallery
+        sink (callable): Called with (student_id, student_name) per recognition
+        voter (VoteAggregator): Confirms students over several frames of a camera before they reach the sink
+        tolerance (float): Largest match distance accepted
+        backend (str): Search backend, see utils.search.make_index
+        search_params (dict): Search backend options
+        detection (dict): FaceDetector arguments
+        frame_step (int): Recognize every n-th frame of each source
+    """
+
+    def __init__(self, sources, paths, load, sink=None, tolerance=0.5, backend='exact',
+                 search_params=None, detection=None, frame_step=1, voter=None):
+        self.sources = dict(sources)
+        self.paths = paths
+        self.load = load
+        self.sink = sink
+        self.voter = voter
+        self.options = {
+            'tolerance': tolerance,
+            'backend': backend,
+            'search': search_params or {},
+            'detection': detection or {},
+            'frame_step': max(1, int(frame_step)),
+        }
+        self.errors = {}
+        self._ctx = mp.get_context('spawn')
+        self._results = None
+        self._stop = None
+        self._controls = {}
+        self._processes = {}
+        self._running = set()
+        self._gallery = None
+        self._stamp = None
+        self._stats = {}
+        self._started_at = None
+
+    def _publish(self):
+        old = self._gallery
+        self._stamp = _file_stamp(self.paths)
+        self._gallery = SharedGallery(*self.load())
+        for control in self._controls.values():
+            control.put(self._gallery.handle)
+        if old is not None:
+            old.close()
+
+    def start(self):
+        self._results = self._ctx.Queue()
+        self._stop = self._ctx.Event()
+        self._stamp = _file_stamp(self.paths)
+        self._gallery = SharedGallery(*self.load())
+        self._started_at = time.perf_counter()
+        for name, source in self.sources.items():
+            control = self._ctx.Queue()
+            process = self._ctx.Process(
+                target=_camera_worker,
+                args=(name, source, self._gallery.handle, self.options, self._results, control, self._stop),
+                daemon=True,
+            )
+            process.start()
+            self._controls[name] = control
+            self._processes[name] = process
+            self._running.add(name)
+            self._stats[name] = {'frames': 0, 'faces': 0, 'recognized': 0, 'busy_seconds': 0.0}
+        return self
+
+    @property
+    def running(self):
+        return bool(self._running)
+
+    def poll(self, timeout=1.0):
+        """
+        Hand worker results to the sink
+
+        Returns:
+            list: (camera, student_id, student_name, distance) recognized since the last poll
+        """
+        if _file_stamp(self.paths) != self._stamp:
+            self._publish()
+
+        recognized = []
+        deadline = time.perf_counter() + timeout
+        while self._running:
+            try:
+                name, frame_no, seconds, detected, faces = self._results.get(
+                    timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                self._reap()
+                break
+            if frame_no is None:
+                self._running.discard(name)
+                continue
+            if frame_no < 0:
+                self.errors[name] = faces
+                continue
+
+            stats = self._stats[name]
+            stats['frames'] += 1
+            stats['faces'] += detected
+            stats['recognized'] += len(faces)
+            stats['busy_seconds'] += seconds
+            marks = faces if self.voter is None else self.voter.observe(faces, source=name)
+            for student_id, student_name, distance in faces:
+                recognized.append((name, student_id, student_name, distance))
+            if self.sink is not None:
+                for student_id, student_name, _ in marks:
+                    self.sink(student_id, student_name)
+        return recognized
+
+    def _reap(self):
+        # A worker killed before its end marker would otherwise count as running forever
+        for name in list(self._running):
+            process = self._processes[name]
+            if not process.is_alive() and process.exitcode:
+                self.errors.setdefault(name, f"Worker exited with code {process.exitcode}")
+                self._running.discard(name)
+
+    def run(self, duration=None):
+        """Poll until every source has ended (video files) or ``duration`` seconds pass"""
+        end = None if duration is None else time.perf_counter() + duration
+        while self.running and (end is None or time.perf_counter() < end):
+            self.poll(timeout=0.5)
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+        for process in self._processes.values():
+            process.join(timeout=5.0)
+            if process.is_alive():
+                process.terminate()
+        self._running.clear()
+        if self._gallery is not None:
+            self._gallery.close()
+            self._gallery = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        """Frames, faces, recognitions and recognition FPS per camera, plus totals"""
+        elapsed = max(time.perf_counter() - (self._started_at or time.perf_counter()), 1e-9)
+        report = {}
+        for name, stats in self._stats.items():
+            report[name] = dict(
+                stats,
+                busy_seconds=round(stats['busy_seconds'], 2),
+                fps=round(stats['frames'] / elapsed, 1),
+                running=name in self._running,
+            )
+        report['total'] = {
+            'frames': sum(stats['frames'] for stats in self._stats.values()),
+            'recognized': sum(stats['recognized'] for stats in self._stats.values()),
+            'fps': round(sum(stats['frames'] for stats in self._stats.values()) / elapsed, 1),
+            'elapsed_seconds': round(elapsed, 2),
+        }
+        return report
+
+
+def parse_sources(sources):
+    """
+    Normalize configured sources into a name -> source dict
+
+    Args:
+        sources: List of sources or dict of name -> source; digit strings
+            become device indexes
+
+    Returns:
+        dict: Camera name -> cv2.VideoCapture argument
+    """
+    if isinstance(sources, dict):
+        items = list(sources.items())
+    else:
+        items = [(f"camera{i}", source) for i, source in enumerate(sources or [])]
+    parsed = {}
+    for name, source in items:
+        if isinstance(source, str) and source.isdigit():
+            source = int(source)
+        parsed[str(name)] = source
+    return parsed
+
+
+def main():
+    from utils.attendance import AttendanceWriter
+    from utils.store import open_store
+    from utils.voting import VoteAggregator
+
+    parser = argparse.ArgumentParser(description="Recognize faces from several cameras or video files")
+    parser.add_argument('sources', nargs='*', help="Capture sources (default: MULTICAM.SOURCES in config.yaml)")
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--duration', type=float, default=None, help="Stop after this many seconds")
+    parser.add_argument('--no-mark', action='store_true', help="Recognize without marking attendance")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        cfg = yaml.load(f, Loader=yaml.FullLoader) or {}
+    multicam = cfg.get('MULTICAM') or {}
+    recognition = cfg.get('RECOGNITION') or {}
+    search = cfg.get('SEARCH') or {}
+    detection = cfg.get('DETECTION') or {}
+    dataset_dir = cfg.get('PATH', {}).get('DATASET_DIR', 'dataset/')
+    store = open_store(cfg.get('PATH', {}).get('STORE_DIR', os.path.join(dataset_dir, 'store')))
+
+    backend, search_params = search_config(search)
+    writer = None if args.no_mark else AttendanceWriter()
+    recognizer = MultiCameraRecognizer(
+        parse_sources(args.sources or multicam.get('SOURCES')),
+        store.paths,
+        store.gallery_arrays,
+        sink=writer.mark if writer else None,
+        tolerance=recognition.get('DEFAULT_TOLERANCE', 0.5),
+        backend=backend,
+        search_params=search_params,
+        detection={
+            'scale': detection.get('SCALE', 1.0),
+            'upsample': detection.get('UPSAMPLE', 1),
+            'model': detection.get('MODEL', 'hog'),
+            'min_face_size': detection.get('MIN_FACE_SIZE', 0),
+        },
+        frame_step=multicam.get('FRAME_STEP', 1),
+        voter=VoteAggregator(recognition.get('VOTE_WINDOW', 10), recognition.get('MIN_VOTES', 5)),
+    )
+    if not recognizer.sources:
+        parser.error("no capture sources given or configured")
+
+    with recognizer:
+        try:
+            recognizer.run(args.duration)
+        except KeyboardInterrupt:
+            pass
+    if writer:
+        writer.close()
+
+    for name, stats in recognizer.stats().items():
+        print(f"{name}: {stats}")
+    for name, error in recognizer.errors.items():
+        print(f"{name} failed: {error}")
+
+
+if __name__ == '__main__':
+    main()
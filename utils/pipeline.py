@@ -0,0 +1,218 @@
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+
+class FPSMeter:
+    """
+    Rolling frames-per-second counter over the last few seconds
+
+    Args:
+        window (float): Length of the rolling window in seconds
+    """
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self._ticks = collections.deque()
+        self._lock = threading.Lock()
+
+    def tick(self):
+        now = time.perf_counter()
+        with self._lock:
+            self._ticks.append(now)
+            while self._ticks and now - self._ticks[0] > self.window:
+                self._ticks.popleft()
+
+    @property
+    def fps(self):
+        now = time.perf_counter()
+        with self._lock:
+            while self._ticks and now - self._ticks[0] > self.window:
+                self._ticks.popleft()
+            if len(self._ticks) < 2:
+                return 0.0
+            return (len(self._ticks) - 1) / (self._ticks[-1] - self._ticks[0])
+
+
+class LatestQueue:
+    """
+    Bounded queue that drops its oldest item instead of blocking the producer
+
+    Args:
+        maxsize (int): Number of items kept; 1 means "latest value only"
+    """
+
+    def __init__(self, maxsize=1):
+        self._items = collections.deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Pop the oldest kept item, or return None after the timeout"""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+
+class WebcamPipeline:
+    """
+    Staged capture -> recognize -> render pipeline for a live camera
+
+    A capture thread reads frames as fast as the camera delivers them into a
+    one-slot queue, so stale frames are overwritten rather than buffered.
+    A dispatcher hands the newest frame to a worker pool whenever a worker is
+    free, and finished frames are published to a one-slot result queue that
+    the caller renders from. End-to-end latency is therefore bounded by one
+    capture interval plus one recognition pass, however slow recognition is.
+
+    Args:
+        source: Camera index, video path/URL, or an object with read()/release()
+        process (callable): Takes a BGR frame, returns the result to render, or
+            None when there is nothing new to show
+        width (int): Requested capture width
+        height (int): Requested capture height
+        workers (int): Number of frames recognized concurrently
+    """
+
+    def __init__(self, source, process, width=640, height=480, workers=2):
+        self.source = source
+        self.process = process
+        self.width = width
+        self.height = height
+        self.workers = max(1, int(workers))
+        self.error = None
+
+        self.fps = {
+            'capture': FPSMeter(),
+            'process': FPSMeter(),
+            'render': FPSMeter(),
+        }
+        self.latency = 0.0
+
+        self._frames = LatestQueue(1)
+        self._results = LatestQueue(1)
+        self._stop = threading.Event()
+        self._slots = threading.Semaphore(self.workers)
+        self._published = -1
+        self._publish_lock = threading.Lock()
+        self._threads = []
+        self._pool = None
+        self._cam = None
+
+    def start(self):
+        if hasattr(self.source, 'read'):
+            self._cam = self.source
+        else:
+            self._cam = cv2.VideoCapture(self.source)
+            self._cam.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+            self._cam.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._threads = [
+            threading.Thread(target=self._capture_loop, daemon=True),
+            threading.Thread(target=self._dispatch_loop, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+        if self._cam is not None and hasattr(self._cam, 'release'):
+            self._cam.release()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def running(self):
+        return not self._stop.is_set()
+
+    def _capture_loop(self):
+        seq = 0
+        while not self._stop.is_set():
+            ret, frame = self._cam.read()
+            if not ret:
+                self.error = "Failed to capture frame from camera"
+                self._stop.set()
+                break
+            self.fps['capture'].tick()
+            self._frames.put((seq, time.perf_counter(), frame))
+            seq += 1
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            if not self._slots.acquire(timeout=0.1):
+                continue
+            item = self._frames.get(timeout=0.1)
+            if item is None:
+                self._slots.release()
+                continue
+            self._pool.submit(self._run, *item)
+
+    def _run(self, seq, captured_at, frame):
+        try:
+            result = self.process(frame)
+        except Exception as e:
+            self.error = f"Error processing frame: {e}"
+            return
+        finally:
+            self._slots.release()
+
+        # Nothing to show; keep the last published result in the slot
+        if result is None:
+            return
+        self.fps['process'].tick()
+        with self._publish_lock:
+            # Workers may finish out of order; never publish an older frame
+            if seq <= self._published:
+                return
+            self._published = seq
+            self.latency = time.perf_counter() - captured_at
+        self._results.put(result)
+
+    def latest(self, timeout=1.0):
+        """
+        Wait for the newest processed frame
+
+        Args:
+            timeout (float): Seconds to wait before giving up
+
+        Returns:
+            The result of ``process`` for the newest frame, or None
+        """
+        result = self._results.get(timeout)
+        if result is not None:
+            self.fps['render'].tick()
+        return result
+
+    def stats(self):
+        """Per-stage FPS, dropped frame counts and the last end-to-end latency"""
+        return {
+            'capture_fps': round(self.fps['capture'].fps, 1),
+            'process_fps': round(self.fps['process'].fps, 1),
+            'render_fps': round(self.fps['render'].fps, 1),
+            'dropped_frames': self._frames.dropped,
+            'dropped_results': self._results.dropped,
+            'latency_ms': round(self.latency * 1000, 1),
+        }
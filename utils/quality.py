@@ -0,0 +1,128 @@
+import threading
+
+import cv2
+import numpy as np
+
+# Crops are compared at this size so sharpness does not depend on face size
+SHARPNESS_SIZE = (64, 64)
+REASONS = ('size', 'brightness', 'sharpness', 'pose')
+
+
+class QualityGate:
+    """
+    Cheap checks that keep hopeless face crops away from the encoder
+
+    Each box is checked in order of cost: size, then mean brightness and
+    Laplacian sharpness of the grayscale crop, then yaw from the five-point
+    landmarks (still far cheaper than a full encoding). The first failing
+    check rejects the box. Rejected faces are reported as unknown, so a
+    tracker retries them on its next detection pass.
+
+    Args:
+        min_size (int): Smallest face side in pixels
+        min_sharpness (float): Lowest variance of the Laplacian of the crop
+        min_brightness (float): Lowest mean gray level (0-255)
+        max_brightness (float): Highest mean gray level (0-255)
+        max_yaw (float): Largest nose offset from the eye midpoint, relative
+            to the eye distance (0 is frontal); None skips the pose check
+    """
+
+    def __init__(self, min_size=40, min_sharpness=40.0, min_brightness=40.0, max_brightness=230.0, max_yaw=0.5):
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_yaw = max_yaw
+        self.checked = 0
+        self.rejected = dict.fromkeys(REASONS, 0)
+        self._lock = threading.Lock()
+
+    def check(self, image, box):
+        """
+        Check one face crop
+
+        Args:
+            image (np.ndarray): RGB frame
+            box (tuple): (top, right, bottom, left) face box
+
+        Returns:
+            str: Name of the first failed check, or None if the crop passes
+        """
+        top, right, bottom, left = box
+        if min(bottom - top, right - left) < self.min_size:
+            return 'size'
+
+        crop = image[max(top, 0):bottom, max(left, 0):right]
+        if crop.size == 0:
+            return 'size'
+        gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+        brightness = gray.mean()
+        if not self.min_brightness <= brightness <= self.max_brightness:
+            return 'brightness'
+        small = cv2.resize(gray, SHARPNESS_SIZE, interpolation=cv2.INTER_AREA)
+        if cv2.Laplacian(small, cv2.CV_64F).var() < self.min_sharpness:
+            return 'sharpness'
+
+        if self.max_yaw is not None and abs(self.yaw(image, box)) > self.max_yaw:
+            return 'pose'
+        return None
+
+    @staticmethod
+    def yaw(image, box):
+        """Horizontal nose offset from the eye midpoint, in eye distances"""
+        import face_recognition as frg
+
+        landmarks = frg.face_landmarks(image, [box], model='small')
+        if not landmarks:
+            return 0.0
+        points = landmarks[0]
+        left_eye = np.mean(points['left_eye'], axis=0)
+        right_eye = np.mean(points['right_eye'], axis=0)
+        nose = np.mean(points['nose_tip'], axis=0)
+        eye_distance = np.linalg.norm(right_eye - left_eye)
+        if eye_distance < 1e-6:
+            return float('inf')
+        return float((nose[0] - (left_eye[0] + right_eye[0]) / 2) / eye_distance)
+
+    def filter(self, image, boxes):
+        """
+        Split boxes into those worth encoding and those to skip
+
+        Args:
+            image (np.ndarray): RGB frame
+            boxes (list): (top, right, bottom, left) face boxes
+
+        Returns:
+            list: One bool per box, True where the crop passed every check
+        """
+        reasons = [self.check(image, box) for box in boxes]
+        with self._lock:
+            self.checked += len(boxes)
+            for reason in reasons:
+                if reason is not None:
+                    self.rejected[reason] += 1
+        return [reason is None for reason in reasons]
+
+    @property
+    def skip_rate(self):
+        """Fraction of checked faces that were not encoded"""
+        return sum(self.rejected.values()) / self.checked if self.checked else 0.0
+
+    def stats(self):
+        """Checked and rejected counts per reason, plus the overall skip rate"""
+        with self._lock:
+            return dict(self.rejected, checked=self.checked, skip_rate=round(self.skip_rate, 3))
+
+
+# Process-wide gates, so skip counts survive Streamlit reruns
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def get_quality_gate(**params):
+    """Get the shared QualityGate for a set of QualityGate arguments"""
+    key = tuple(sorted(params.items()))
+    with _gates_lock:
+        if key not in _gates:
+            _gates[key] = QualityGate(**params)
+        return _gates[key]
@@ -0,0 +1,138 @@
+import bisect
+import os
+import threading
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class Roster:
+    """
+    Searchable, paginated view of the enrolled students' IDs and names
+
+    The view is refreshed incrementally from the store: records the store
+    has not replaced are the same objects as last time, so a refresh only
+    re-indexes students that were added, changed or removed. Queries of three
+    or more characters match anywhere in a name or ID through a trigram
+    index; shorter queries match the start of an ID or of any word of a name
+    through a sorted token list.
+
+    Args:
+        store (EnrollmentStore): Store to mirror
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._records = {}
+        self._order = []
+        self._grams = {}
+        self._tokens = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._records)
+
+    @staticmethod
+    def _keys(record):
+        return record['name'].lower(), str(record['id']).lower()
+
+    def _words(self, record):
+        name, id = self._keys(record)
+        return set(name.split()) | {id}
+
+    def _add(self, idx, record, bulk=False):
+        # In bulk mode the sorted lists are appended to and sorted once by the caller
+        self._records[idx] = record
+        for text in self._keys(record):
+            for gram in _trigrams(text):
+                self._grams.setdefault(gram, set()).add(idx)
+        if bulk:
+            self._order.append(idx)
+            self._tokens.extend((word, idx) for word in self._words(record))
+            return
+        bisect.insort(self._order, idx)
+        for word in self._words(record):
+            bisect.insort(self._tokens, (word, idx))
+
+    def _remove(self, idx):
+        record = self._records.pop(idx)
+        del self._order[bisect.bisect_left(self._order, idx)]
+        for text in self._keys(record):
+            for gram in _trigrams(text):
+                postings = self._grams.get(gram)
+                if postings is not None:
+                    postings.discard(idx)
+                    if not postings:
+                        del self._grams[gram]
+        for word in self._words(record):
+            del self._tokens[bisect.bisect_left(self._tokens, (word, idx))]
+
+    def refresh(self):
+        """Bring the view in step with the store, touching only changed students"""
+        current = self.store.records()
+        with self._lock:
+            for idx in self._records.keys() - current.keys():
+                self._remove(idx)
+            changed = [(idx, record) for idx, record in current.items() if self._records.get(idx) is not record]
+            for idx, _ in changed:
+                if idx in self._records:
+                    self._remove(idx)
+            bulk = len(changed) > 64
+            for idx, record in changed:
+                self._add(idx, record, bulk)
+            if bulk:
+                self._order.sort()
+                self._tokens.sort()
+
+    def _matches(self, query):
+        if not query:
+            return self._order
+
+        if len(query) >= 3:
+            postings = sorted((self._grams.get(gram, set()) for gram in _trigrams(query)), key=len)
+            candidates = set.intersection(*postings) if postings else set()
+            matches = [
+                idx for idx in candidates
+                if any(query in text for text in self._keys(self._records[idx]))
+            ]
+        else:
+            matches = set()
+            i = bisect.bisect_left(self._tokens, (query,))
+            while i < len(self._tokens) and self._tokens[i][0].startswith(query):
+                matches.add(self._tokens[i][1])
+                i += 1
+        return sorted(matches)
+
+    def search(self, query='', page=0, page_size=50):
+        """
+        One page of the students matching a query
+
+        Args:
+            query (str): Text to look for in names and IDs (empty for everyone)
+            page (int): Zero-based page number
+            page_size (int): Students per page
+
+        Returns:
+            tuple: (list of (idx, record) on the page, total number of matches)
+        """
+        with self._lock:
+            matches = self._matches(query.strip().lower())
+            start = max(page, 0) * page_size
+            return [(idx, self._records[idx]) for idx in matches[start:start + page_size]], len(matches)
+
+
+# Process-wide rosters, one per store directory
+_rosters = {}
+_rosters_lock = threading.Lock()
+
+
+def get_roster(store):
+    """Get the shared Roster of a store, refreshed from its current contents"""
+    key = os.path.abspath(store.root)
+    with _rosters_lock:
+        if key not in _rosters:
+            _rosters[key] = Roster(store)
+        roster = _rosters[key]
+    roster.refresh()
+    return roster
@@ -0,0 +1,657 @@
+import argparse
+import copy
+import tempfile
+import time
+
+import numpy as np
+
+BACKENDS = ('exact', 'ivf')
+PRECISIONS = ('float16', 'int8')
+
+# Rows decoded at a time while scanning a quantized index, few enough that
+# the decoded float32 chunk stays in the CPU cache
+SCAN_CHUNK = 4096
+
+
+def _as_matrix(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        return vectors.reshape(1, -1) if vectors.size else vectors.reshape(0, 0)
+    return vectors
+
+
+def _sq_distances(queries, vectors, vector_sq_norms=None):
+    """Squared Euclidean distances between two sets of row vectors"""
+    if vector_sq_norms is None:
+        vector_sq_norms = np.einsum('ij,ij->i', vectors, vectors)
+    query_sq_norms = np.einsum('ij,ij->i', queries, queries)
+    sq = query_sq_norms[:, None] + vector_sq_norms[None, :] - 2.0 * (queries @ vectors.T)
+    np.maximum(sq, 0.0, out=sq)
+    return sq
+
+
+def _is_memmap(array):
+    """Whether an array's memory comes from a memory-mapped file"""
+    while isinstance(array, np.ndarray):
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+def _top_k(labels, sq, k):
+    """Pick the k smallest squared distances per row, padded with -1 / inf"""
+    m = sq.shape[0]
+    out_labels = np.full((m, k), -1, dtype=np.int64)
+    out_dist = np.full((m, k), np.inf, dtype=np.float32)
+    n = sq.shape[1]
+    if n == 0:
+        return out_labels, out_dist
+
+    kk = min(k, n)
+    part = np.argpartition(sq, kk - 1, axis=1)[:, :kk]
+    part_sq = np.take_along_axis(sq, part, axis=1)
+    order = np.argsort(part_sq, axis=1)
+    part = np.take_along_axis(part, order, axis=1)
+    out_labels[:, :kk] = labels[part]
+    out_dist[:, :kk] = np.sqrt(np.take_along_axis(part_sq, order, axis=1))
+    return out_labels, out_dist
+
+
+class ExactIndex:
+    """
+    Brute-force nearest-neighbour search over every stored vector
+
+    Vectors are identified by integer labels chosen by the caller.
+    """
+
+    def __init__(self):
+        self.labels = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def copy(self):
+        """Copy that can be changed without affecting this index"""
+        # add / remove assign new arrays instead of writing into the shared ones
+        return copy.copy(self)
+
+    def build(self, labels, vectors):
+        """Replace the index contents with the given labelled vectors"""
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.vectors = _as_matrix(vectors)
+        self._sq_norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+
+    def add(self, labels, vectors):
+        """Append labelled vectors to the index"""
+        if len(self.labels) == 0:
+            self.build(labels, vectors)
+            return
+        vectors = _as_matrix(vectors)
+        self.labels = np.concatenate([self.labels, np.asarray(labels, dtype=np.int64)])
+        self.vectors = np.concatenate([self.vectors, vectors])
+        self._sq_norms = np.concatenate([self._sq_norms, np.einsum('ij,ij->i', vectors, vectors)])
+
+    def remove(self, labels):
+        """Drop every vector carrying one of the given labels"""
+        keep = ~np.isin(self.labels, np.asarray(labels, dtype=np.int64))
+        self.labels = self.labels[keep]
+        self.vectors = self.vectors[keep]
+        self._sq_norms = self._sq_norms[keep]
+
+    def search(self, queries, k=1):
+        """
+        Find the k nearest stored vectors for each query
+
+        Args:
+            queries (array-like): M x D query vectors
+            k (int): Number of neighbours to return
+
+        Returns:
+            tuple: (labels, distances), both M x k, padded with -1 / inf
+        """
+        queries = _as_matrix(queries)
+        if len(self.labels) == 0:
+            return _top_k(self.labels, np.empty((len(queries), 0), dtype=np.float32), k)
+        return _top_k(self.labels, _sq_distances(queries, self.vectors, self._sq_norms), k)
+
+
+class QuantizedIndex:
+    """
+    Brute-force search over compact copies of the vectors, re-ranked exactly
+
+    Every query scans a contiguous float16 or int8 copy of the vectors (2x or
+    4x fewer bytes than float32). The ``rerank`` nearest candidates of that
+    scan are then compared against the full-precision vectors, so returned
+    distances are exact and only rows that fall out of the shortlist can
+    change a decision. Only shortlisted full-precision rows are ever read,
+    so they are kept on disk: the enrollment store's memory-mapped snapshot
+    is used as it is, and rows handed over in RAM (pending log records or
+    deleted rows) are written to a temporary memory-mapped file.
+
+    int8 codes use one offset and step per dimension, calibrated on the
+    vectors the index was built from and recalibrated when added vectors
+    fall outside that range. The offset and step are folded into each query,
+    so a scan only widens the codes to float32, a cache-sized chunk at a
+    time, before the same matrix product as exact search; it runs about as
+    fast as exact search. numpy widens float16 in software, so float16 scans
+    are several times slower than float32 and only pay off for their
+    precision. Either mode helps once the float32 gallery matrix is too
+    large to keep in RAM; for a gallery that fits, exact search is as fast
+    and simpler.
+
+    Args:
+        precision (str): 'float16' or 'int8'
+        rerank (int): Candidates re-ranked at full precision per query; 0
+            returns the approximate distances as they are
+    """
+
+    def __init__(self, precision='int8', rerank=16):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+        self.precision = precision
+        self.rerank = rerank
+        self.labels = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.codes = np.empty((0, 0), dtype=np.float16 if precision == 'float16' else np.uint8)
+        self._offset = None
+        self._step = None
+        self._sq_norms = np.empty(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def copy(self):
+        """Copy that can be changed without affecting this index"""
+        # add / remove assign new arrays instead of writing into the shared ones
+        return copy.copy(self)
+
+    def _calibrate(self, vectors):
+        low, high = vectors.min(axis=0), vectors.max(axis=0)
+        self._offset = low.astype(np.float32)
+        self._step = (np.maximum(high - low, 1e-6) / 255.0).astype(np.float32)
+
+    def _encode(self, vectors):
+        if self.precision == 'float16':
+            return vectors.astype(np.float16)
+        codes = np.rint((vectors - self._offset) / self._step)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def _decode(self, codes):
+        if self.precision == 'float16':
+            return codes.astype(np.float32)
+        return codes.astype(np.float32) * self._step + self._offset
+
+    def _norms(self, codes):
+        norms = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_CHUNK):
+            decoded = self._decode(codes[start:start + SCAN_CHUNK])
+            norms[start:start + SCAN_CHUNK] = np.einsum('ij,ij->i', decoded, decoded)
+        return norms
+
+    def _out_of_range(self, vectors):
+        if self.precision == 'float16' or self._offset is None:
+            return False
+        return bool(np.any(vectors < self._offset) or np.any(vectors > self._offset + 255.0 * self._step))
+
+    @staticmethod
+    def _on_disk(vectors):
+        """The vectors as a memory map, written to a temporary file unless they already are one"""
+        if _is_memmap(vectors) or len(vectors) == 0:
+            return vectors
+        with tempfile.TemporaryFile() as f:
+            vectors.tofile(f)
+            f.flush()
+            # The map keeps its own handle, so the file is gone once the map is
+            return np.memmap(f, dtype=np.float32, mode='r', shape=vectors.shape)
+
+    def build(self, labels, vectors):
+        """Replace the index contents with the given labelled vectors"""
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.vectors = self._on_disk(_as_matrix(vectors))
+        if len(self.vectors) and self.precision == 'int8':
+            self._calibrate(self.vectors)
+        self.codes = self._encode(self.vectors) if len(self.vectors) else self.codes[:0]
+        self._sq_norms = self._norms(self.codes)
+
+    def add(self, labels, vectors):
+        """Append labelled vectors to the index"""
+        vectors = _as_matrix(vectors)
+        if len(self.labels) == 0 or self._out_of_range(vectors):
+            self.build(np.concatenate([self.labels, np.asarray(labels, dtype=np.int64)]),
+                       np.concatenate([self.vectors, vectors]) if len(self.labels) else vectors)
+            return
+        codes = self._encode(vectors)
+        self.labels = np.concatenate([self.labels, np.asarray(labels, dtype=np.int64)])
+        self.vectors = self._on_disk(np.concatenate([self.vectors, vectors]))
+        self.codes = np.concatenate([self.codes, codes])
+        self._sq_norms = np.concatenate([self._sq_norms, self._norms(codes)])
+
+    def remove(self, labels):
+        """Drop every vector carrying one of the given labels"""
+        keep = ~np.isin(self.labels, np.asarray(labels, dtype=np.int64))
+        self.labels = self.labels[keep]
+        self.vectors = self._on_disk(np.asarray(self.vectors[keep]))
+        self.codes = self.codes[keep]
+        self._sq_norms = self._sq_norms[keep]
+
+    def _scan(self, queries):
+        """Approximate squared distances from each query to every stored vector"""
+        # |q - (offset + step * c)|^2 = |q|^2 + |decoded c|^2 - 2 ((q * step) . c + q . offset)
+        if self.precision == 'int8':
+            weights, shift = queries * self._step, queries @ self._offset
+        else:
+            weights, shift = queries, np.zeros(len(queries), dtype=np.float32)
+        base = np.einsum('ij,ij->i', queries, queries) - 2.0 * shift
+
+        sq = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        chunk = np.empty((min(SCAN_CHUNK, len(self.codes)), self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(self.codes), SCAN_CHUNK):
+            end = min(start + SCAN_CHUNK, len(self.codes))
+            widened = chunk[:end - start]
+            np.copyto(widened, self.codes[start:end], casting='unsafe')
+            sq[:, start:end] = base[:, None] + self._sq_norms[None, start:end] - 2.0 * (weights @ widened.T)
+        np.maximum(sq, 0.0, out=sq)
+        return sq
+
+    def search(self, queries, k=1):
+        """
+        Find the k nearest stored vectors for each query
+
+        Args:
+            queries (array-like): M x D query vectors
+            k (int): Number of neighbours to return
+
+        Returns:
+            tuple: (labels, distances), both M x k, padded with -1 / inf
+        """
+        queries = _as_matrix(queries)
+        positions = np.arange(len(self.labels))
+        if len(self.labels) == 0:
+            return _top_k(self.labels, np.empty((len(queries), 0), dtype=np.float32), k)
+        if not self.rerank:
+            return _top_k(self.labels, self._scan(queries), k)
+
+        shortlist, _ = _top_k(positions, self._scan(queries), max(k, self.rerank))
+        valid = shortlist >= 0
+        candidates = np.asarray(self.vectors[np.where(valid, shortlist, 0).ravel()]).reshape(*shortlist.shape, -1)
+        diff = candidates - queries[:, None, :]
+        sq = np.einsum('mrd,mrd->mr', diff, diff)
+        sq[~valid] = np.inf
+        order = np.argsort(sq, axis=1)[:, :k]
+        out_labels = np.full((len(queries), k), -1, dtype=np.int64)
+        out_dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+        kk = order.shape[1]
+        picked = np.take_along_axis(shortlist, order, axis=1)
+        picked_sq = np.take_along_axis(sq, order, axis=1)
+        found = picked >= 0
+        out_labels[:, :kk] = np.where(found, self.labels[np.where(found, picked, 0)], -1)
+        out_dist[:, :kk] = np.sqrt(picked_sq)
+        return out_labels, out_dist
+
+    def memory_report(self):
+        """
+        Bytes read per query scan and bytes held in RAM, against a float32 matrix
+
+        The full-precision rows count as resident unless they are a memory
+        map, e.g. the store's snapshot handed over without a copy.
+
+        Returns:
+            dict: vectors, float32_bytes, scanned_bytes, resident_bytes and
+                full_precision_in_ram
+        """
+        scanned_bytes = self.codes.nbytes + self._sq_norms.nbytes
+        if self._offset is not None:
+            scanned_bytes += self._offset.nbytes + self._step.nbytes
+        in_ram = len(self.labels) > 0 and not _is_memmap(self.vectors)
+        return {
+            'vectors': len(self.labels),
+            'float32_bytes': int(len(self.labels) * self.vectors.shape[-1] * 4) if len(self.labels) else 0,
+            'scanned_bytes': int(scanned_bytes),
+            'resident_bytes': int(scanned_bytes + (self.vectors.nbytes if in_ram else 0)),
+            'full_precision_in_ram': in_ram,
+        }
+
+
+def kmeans(vectors, n_clusters, n_iter=10, seed=0):
+    """
+    Plain Lloyd's k-means
+
+    Args:
+        vectors (np.ndarray): N x D float32 training vectors
+        n_clusters (int): Number of centroids
+        n_iter (int): Number of Lloyd iterations
+        seed (int): Seed for the initial centroid sample
+
+    Returns:
+        np.ndarray: n_clusters x D float32 centroids
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assign = np.argmin(_sq_distances(vectors, centroids), axis=1)
+        counts = np.bincount(assign, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters on random training points
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index: k-means coarse clusters, exact search inside them
+
+    Each query is compared against the ``nprobe`` closest clusters only, so
+    the cost per query drops from N to roughly ``N * nprobe / nlist``.
+
+    Args:
+        nlist (int): Number of coarse clusters (default: sqrt of gallery size)
+        nprobe (int): Number of clusters scanned per query
+        retrain_factor (float): Retrain the clusters once the index has grown
+            this many times past the size it was trained on
+        seed (int): Seed for k-means initialisation
+    """
+
+    def __init__(self, nlist=None, nprobe=8, retrain_factor=4.0, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.retrain_factor = retrain_factor
+        self.seed = seed
+        self.centroids = None
+        self._lists = []
+        self._list_of_label = {}
+        self._trained_size = 0
+
+    def __len__(self):
+        return len(self._list_of_label)
+
+    def copy(self):
+        """Copy that can be changed without affecting this index"""
+        other = copy.copy(self)
+        other._lists = [list(entry) for entry in self._lists]
+        other._list_of_label = dict(self._list_of_label)
+        return other
+
+    def build(self, labels, vectors):
+        """Train the coarse clusters and fill the inverted lists"""
+        labels = np.asarray(labels, dtype=np.int64)
+        vectors = _as_matrix(vectors)
+        self._list_of_label = {}
+
+        if len(labels) == 0:
+            self.centroids = None
+            self._lists = []
+            self._trained_size = 0
+            return
+
+        nlist = self.nlist or max(1, int(round(np.sqrt(len(labels)))))
+        self.centroids = kmeans(vectors, nlist, seed=self.seed)
+        self._lists = [
+            [np.empty(0, dtype=np.int64), np.empty((0, vectors.shape[1]), dtype=np.float32)]
+            for _ in range(len(self.centroids))
+        ]
+        self._trained_size = len(labels)
+        self._insert(labels, vectors)
+
+    def _insert(self, labels, vectors):
+        assign = np.argmin(_sq_distances(vectors, self.centroids), axis=1)
+        for list_no in np.unique(assign):
+            sel = assign == list_no
+            entry = self._lists[list_no]
+            entry[0] = np.concatenate([entry[0], labels[sel]])
+            entry[1] = np.concatenate([entry[1], vectors[sel]])
+            for label in labels[sel]:
+                self._list_of_label[int(label)] = int(list_no)
+
+    def _all(self):
+        labels = np.concatenate([entry[0] for entry in self._lists])
+        vectors = np.concatenate([entry[1] for entry in self._lists])
+        return labels, vectors
+
+    def add(self, labels, vectors):
+        """Assign new labelled vectors to their nearest clusters"""
+        labels = np.asarray(labels, dtype=np.int64)
+        vectors = _as_matrix(vectors)
+        if self.centroids is None:
+            self.build(labels, vectors)
+            return
+
+        self._insert(labels, vectors)
+        if len(self) > self.retrain_factor * self._trained_size:
+            self.build(*self._all())
+
+    def remove(self, labels):
+        """Drop every vector carrying one of the given labels"""
+        by_list = {}
+        for label in np.asarray(labels, dtype=np.int64):
+            list_no = self._list_of_label.pop(int(label), None)
+            if list_no is not None:
+                by_list.setdefault(list_no, []).append(label)
+
+        for list_no, dropped in by_list.items():
+            entry = self._lists[list_no]
+            keep = ~np.isin(entry[0], dropped)
+            entry[0] = entry[0][keep]
+            entry[1] = entry[1][keep]
+
+    def search(self, queries, k=1, nprobe=None):
+        """
+        Find approximately the k nearest stored vectors for each query
+
+        Args:
+            queries (array-like): M x D query vectors
+            k (int): Number of neighbours to return
+            nprobe (int): Clusters scanned per query (default: self.nprobe)
+
+        Returns:
+            tuple: (labels, distances), both M x k, padded with -1 / inf
+        """
+        queries = _as_matrix(queries)
+        out_labels = np.full((len(queries), k), -1, dtype=np.int64)
+        out_dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+        if self.centroids is None or len(queries) == 0:
+            return out_labels, out_dist
+
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        coarse = _sq_distances(queries, self.centroids)
+        probes = np.argpartition(coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        for i, query in enumerate(queries):
+            entries = [self._lists[list_no] for list_no in probes[i]]
+            labels = np.concatenate([entry[0] for entry in entries])
+            vectors = np.concatenate([entry[1] for entry in entries])
+            sq = _sq_distances(query[None, :], vectors)
+            out_labels[i], out_dist[i] = _top_k(labels, sq, k)
+
+        return out_labels, out_dist
+
+
+def make_index(backend='exact', **params):
+    """
+    Create an empty search index
+
+    Args:
+        backend (str): 'exact' for brute force or 'ivf' for the approximate index
+        **params: Backend options, e.g. nlist / nprobe for 'ivf', or
+            quantize ('float16' / 'int8') and rerank for 'exact'
+
+    Returns:
+        ExactIndex, QuantizedIndex or IVFIndex: The new index
+    """
+    if backend == 'exact':
+        if params.get('quantize'):
+            return QuantizedIndex(params['quantize'], params.get('rerank', 16))
+        return ExactIndex()
+    if backend == 'ivf':
+        return IVFIndex(**params)
+    raise ValueError(f"Unknown search backend '{backend}', expected one of {BACKENDS}")
+
+
+def search_config(search):
+    """
+    Backend and make_index options from the SEARCH section of config.yaml
+
+    Args:
+        search (dict): SEARCH section (BACKEND, NLIST, NPROBE, QUANTIZE, RERANK)
+
+    Returns:
+        tuple: (backend, params) for make_index
+    """
+    backend = search.get('BACKEND', 'exact')
+    if backend == 'ivf':
+        return backend, {'nlist': search.get('NLIST'), 'nprobe': search.get('NPROBE', 8)}
+    if search.get('QUANTIZE'):
+        return backend, {'quantize': search['QUANTIZE'], 'rerank': search.get('RERANK', 16)}
+    return backend, {}
+
+
+def recall_report(vectors, queries, nprobes=(1, 2, 4, 8, 16, 32), nlist=None, k=1):
+    """
+    Measure IVF recall and latency against exact search
+
+    Args:
+        vectors (array-like): N x D gallery vectors
+        queries (array-like): M x D query vectors
+        nprobes (iterable): Probe counts to evaluate
+        nlist (int): Number of coarse clusters (default: sqrt(N))
+        k (int): Neighbours per query; recall is measured over the top k
+
+    Returns:
+        list: One dict per setting with backend, nprobe, recall and the mean
+            latency per query in milliseconds
+    """
+    vectors = _as_matrix(vectors)
+    queries = _as_matrix(queries)
+    labels = np.arange(len(vectors))
+
+    exact = ExactIndex()
+    exact.build(labels, vectors)
+    start = time.perf_counter()
+    truth, _ = exact.search(queries, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    report = [{'backend': 'exact', 'nprobe': None, 'recall': 1.0, 'latency_ms': round(exact_ms, 4)}]
+
+    ivf = IVFIndex(nlist=nlist)
+    ivf.build(labels, vectors)
+    for nprobe in nprobes:
+        if nprobe > len(ivf.centroids):
+            break
+        start = time.perf_counter()
+        found, _ = ivf.search(queries, k, nprobe=nprobe)
+        ivf_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        hits = sum(len(np.intersect1d(f, t)) for f, t in zip(found, truth))
+        report.append({
+            'backend': 'ivf',
+            'nprobe': nprobe,
+            'recall': round(hits / truth.size, 4),
+            'latency_ms': round(ivf_ms, 4),
+        })
+
+    return report
+
+
+def quantization_report(vectors, queries, tolerance, reranks=(0, 4, 16)):
+    """
+    Measure memory, latency and match decisions of quantized search against exact
+
+    A decision is the matched row, or no match when the nearest row is
+    farther than ``tolerance``; a change is any query whose decision differs
+    from exact float32 search.
+
+    Args:
+        vectors (array-like): N x D gallery vectors
+        queries (array-like): M x D query vectors
+        tolerance (float): Largest match distance accepted
+        reranks (iterable): Shortlist sizes to evaluate (0 for no re-ranking)
+
+    Returns:
+        list: One dict per setting with precision, rerank, scanned bytes,
+            resident bytes, decision changes and mean latency per query in ms
+    """
+    vectors = _as_matrix(vectors)
+    queries = _as_matrix(queries)
+    labels = np.arange(len(vectors))
+
+    def decide(index):
+        start = time.perf_counter()
+        rows, dist = index.search(queries, 1)
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+        return np.where(dist[:, 0] <= tolerance, rows[:, 0], -1), ms
+
+    exact = ExactIndex()
+    exact.build(labels, vectors)
+    truth, exact_ms = decide(exact)
+    report = [{
+        'precision': 'float32', 'rerank': None, 'scanned_bytes': int(vectors.nbytes),
+        'resident_bytes': int(vectors.nbytes),
+        'changed': 0, 'matches': int(np.sum(truth >= 0)), 'latency_ms': round(exact_ms, 4),
+    }]
+
+    for precision in PRECISIONS:
+        for rerank in reranks:
+            index = QuantizedIndex(precision, rerank)
+            index.build(labels, vectors)
+            decisions, ms = decide(index)
+            memory = index.memory_report()
+            report.append({
+                'precision': precision,
+                'rerank': rerank,
+                'scanned_bytes': memory['scanned_bytes'],
+                'resident_bytes': memory['resident_bytes'],
+                'changed': int(np.sum(decisions != truth)),
+                'matches': int(np.sum(decisions >= 0)),
+                'latency_ms': round(ms, 4),
+            })
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF recall and quantized search decisions versus exact search")
+    parser.add_argument('--size', type=int, default=30000, help="Number of gallery encodings")
+    parser.add_argument('--queries', type=int, default=200, help="Number of query encodings")
+    parser.add_argument('--nlist', type=int, default=None, help="Number of coarse clusters")
+    parser.add_argument('--k', type=int, default=1, help="Neighbours per query")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="Match tolerance for the quantization report")
+    parser.add_argument('--store', default=None, help="Use the encodings of this enrollment store directory")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.store:
+        from utils.store import open_store
+        vectors = np.asarray(open_store(args.store).gallery_arrays()[3], dtype=np.float32)
+    else:
+        # Face encodings cluster around a common mean; mimic that with noisy copies
+        vectors = rng.normal(0, 0.1, (args.size, 128)).astype(np.float32)
+    picks = rng.choice(len(vectors), args.queries)
+    queries = vectors[picks] + rng.normal(0, 0.03, (args.queries, 128)).astype(np.float32)
+
+    print(f"{'backend':<8} {'nprobe':>6} {'recall':>7} {'ms/query':>9}")
+    for row in recall_report(vectors, queries, nlist=args.nlist, k=args.k):
+        nprobe = '-' if row['nprobe'] is None else row['nprobe']
+        print(f"{row['backend']:<8} {nprobe:>6} {row['recall']:>7.4f} {row['latency_ms']:>9.4f}")
+
+    # Spread query noise so some distances land on either side of the tolerance
+    noise = rng.uniform(0.0, 2.0 * args.tolerance / np.sqrt(128), (args.queries, 1)).astype(np.float32)
+    queries = vectors[picks] + noise * rng.normal(0, 1, (args.queries, 128)).astype(np.float32)
+    print()
+    print(f"{'precision':<9} {'rerank':>6} {'scanned MB':>10} {'resident MB':>11} {'changed':>8} {'matches':>8} {'ms/query':>9}")
+    for row in quantization_report(vectors, queries, args.tolerance):
+        rerank = '-' if row['rerank'] is None else row['rerank']
+        print(f"{row['precision']:<9} {rerank:>6} {row['scanned_bytes'] / 1e6:>10.2f} {row['resident_bytes'] / 1e6:>11.2f} "
+              f"{row['changed']:>8} {row['matches']:>8} {row['latency_ms']:>9.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,632 @@
+import argparse
+import collections
+import os
+import pickle
+import sqlite3
+import threading
+import uuid
+from contextlib import closing, contextmanager
+
+import cv2
+import numpy as np
+
+ENCODING_DIM = 128
+THUMBNAIL_SIZE = 320
+THUMBNAIL_QUALITY = 85
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    idx INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    thumb TEXT,
+    file TEXT
+);
+CREATE INDEX IF NOT EXISTS students_id ON students (id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def encode_thumbnail(image, size=THUMBNAIL_SIZE, quality=THUMBNAIL_QUALITY):
+    """
+    Compress an RGB image into a JPEG thumbnail
+
+    Args:
+        image (np.ndarray): RGB image
+        size (int): Longest side of the thumbnail in pixels
+        quality (int): JPEG quality
+
+    Returns:
+        bytes: JPEG data
+    """
+    height, width = image.shape[:2]
+    scale = size / float(max(height, width))
+    if scale < 1.0:
+        image = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode('.jpg', cv2.cvtColor(image, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode thumbnail")
+    return buf.tobytes()
+
+
+def _atomic_write(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _save_npy(path, array):
+    tmp_path = path + '.tmp.npy'
+    np.save(tmp_path, np.ascontiguousarray(array, dtype=np.float32).reshape(-1, ENCODING_DIM))
+    os.replace(tmp_path, path)
+
+
+class EnrollmentStore:
+    """
+    Enrollment store split into embeddings, metadata and thumbnails
+
+    - ``embeddings[.<gen>].npy``: float32 snapshot matrix, memory-mapped on read
+    - ``embeddings[.<gen>].log``: encodings enrolled since the snapshot,
+      appended as raw 128 x float32 records
+    - ``meta.sqlite``: one row per student (index, ID, name, matrix row,
+      thumbnail file, source dataset file) plus the current generation
+    - ``thumbs/``: JPEG thumbnails of the enrollment photos, read on demand
+
+    Recognition only needs the embedding files and the ID/name columns, so
+    memory grows with N x 128 floats rather than with total image pixels.
+
+    A single-student write appends one record to the log and changes one
+    SQLite row inside an immediate transaction, so it costs O(1) and is
+    serialised against writers in other sessions and processes. Once the log
+    or the number of dead rows grows past ``compact_rows``, the live rows are
+    compacted into a new generation's snapshot, written via temp file and
+    rename and switched to in the same transaction that renumbers the rows.
+
+    Lookups go through an in-memory ID -> index hash map that every write
+    keeps in step; it is reloaded only when another process has committed
+    to the metadata file. Matrix rows map back to students through the
+    recognition gallery built from gallery_arrays. Thumbnail files are
+    never rewritten in place (each write gets a new name), so decoded
+    thumbnails are kept in a bounded LRU cache keyed by file name.
+
+    Args:
+        root (str): Directory holding the store files
+        compact_rows (int): Log / dead row count that triggers compaction
+        thumb_cache_size (int): Decoded thumbnails kept in memory
+    """
+
+    def __init__(self, root, compact_rows=1024, thumb_cache_size=256):
+        self.root = root
+        self.compact_rows = compact_rows
+        self.thumb_cache_size = thumb_cache_size
+        self._thumbs = collections.OrderedDict()
+        self._thumbs_lock = threading.Lock()
+        self._lock = threading.RLock()
+        self._cache = None
+        self._cache_stamp = None
+        self.meta_path = os.path.join(root, 'meta.sqlite')
+        self.thumbs_dir = os.path.join(root, 'thumbs')
+        os.makedirs(self.thumbs_dir, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.meta_path, timeout=30, isolation_level=None)
+
+    @contextmanager
+    def _transaction(self, mode='IMMEDIATE'):
+        conn = self._connect()
+        try:
+            conn.execute(f"BEGIN {mode}")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _get_meta(conn, key, default=None):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _snapshot_path(self, gen):
+        return os.path.join(self.root, f'embeddings.{gen}.npy' if gen else 'embeddings.npy')
+
+    def _log_path(self, gen):
+        return os.path.join(self.root, f'embeddings.{gen}.log' if gen else 'embeddings.log')
+
+    @property
+    def paths(self):
+        """Files whose modification means the gallery must be reloaded"""
+        return (self.meta_path,)
+
+    @property
+    def migrated(self):
+        """Whether a legacy pickle has already been imported"""
+        with closing(self._connect()) as conn:
+            return self._get_meta(conn, 'migrated') is not None
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+
+    def _snapshot_rows(self, gen):
+        path = self._snapshot_path(gen)
+        if not os.path.exists(path):
+            return 0
+        return np.load(path, mmap_mode='r').shape[0]
+
+    def _log_rows(self, gen):
+        path = self._log_path(gen)
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // (ENCODING_DIM * 4)
+
+    def _embeddings(self, gen):
+        parts = []
+        path = self._snapshot_path(gen)
+        if os.path.exists(path):
+            parts.append(np.load(path, mmap_mode='r'))
+        log_rows = self._log_rows(gen)
+        if log_rows:
+            parts.append(np.memmap(self._log_path(gen), dtype=np.float32, mode='r', shape=(log_rows, ENCODING_DIM)))
+
+        if not parts:
+            return np.empty((0, ENCODING_DIM), dtype=np.float32)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def _read(self):
+        """Generation and records from one consistent read"""
+        with self._transaction('DEFERRED') as conn:
+            gen = int(self._get_meta(conn, 'gen', 0))
+            rows = conn.execute("SELECT idx, id, name, row, thumb, file FROM students ORDER BY idx").fetchall()
+        records = {
+            idx: {'id': id, 'name': name, 'row': row, 'thumb': thumb, 'file': file}
+            for idx, id, name, row, thumb, file in rows
+        }
+        return gen, records
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.meta_path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _index(self):
+        """
+        Cached (gen, records, idx_of_id), reloaded when the metadata file
+        was changed by someone else
+        """
+        with self._lock:
+            stamp = self._stamp()
+            if self._cache is None or self._cache_stamp != stamp:
+                gen, records = self._read()
+                idx_of_id = {record['id']: idx for idx, record in records.items()}
+                self._cache = (gen, records, idx_of_id)
+                self._cache_stamp = stamp
+            return self._cache
+
+    @contextmanager
+    def _write(self, invalidate=False):
+        """
+        Write transaction yielding (conn, cache); cache is None when the
+        in-memory indexes are stale and will simply be reloaded afterwards
+        """
+        with self._lock:
+            try:
+                with self._transaction() as conn:
+                    cache = None
+                    if not invalidate and self._cache is not None and self._cache_stamp == self._stamp():
+                        cache = self._cache
+                    yield conn, cache
+            except BaseException:
+                self._cache = None
+                raise
+            if cache is None:
+                self._cache = None
+            else:
+                self._cache_stamp = self._stamp()
+
+    @staticmethod
+    def _cache_remove(cache, idx):
+        if cache is None:
+            return
+        _, records, idx_of_id = cache
+        old = records.pop(idx, None)
+        if old is not None and idx_of_id.get(old['id']) == idx:
+            del idx_of_id[old['id']]
+
+    @classmethod
+    def _cache_put(cls, cache, idx, record):
+        if cache is None:
+            return
+        _, records, idx_of_id = cache
+        cls._cache_remove(cache, idx)
+        records[idx] = record
+        idx_of_id[record['id']] = idx
+
+    def embeddings(self):
+        """Embedding matrix of the current generation, memory-mapped where possible"""
+        with closing(self._connect()) as conn:
+            gen = int(self._get_meta(conn, 'gen', 0))
+        return self._embeddings(gen)
+
+    def records(self):
+        """
+        Metadata of every student
+
+        Returns:
+            dict: idx -> {'id', 'name', 'row', 'thumb', 'file'}
+        """
+        return dict(self._index()[1])
+
+    def gallery_arrays(self):
+        """
+        Keys, IDs, names and encodings for building a recognition gallery
+
+        Returns:
+            tuple: (keys, ids, names, N x 128 float32 encodings)
+        """
+        gen, records, _ = self._index()
+        keys = list(records.keys())
+        rows = np.array([records[key]['row'] for key in keys], dtype=np.int64)
+        embeddings = self._embeddings(gen)
+        if len(rows) == len(embeddings) and np.array_equal(rows, np.arange(len(rows))):
+            encodings = embeddings
+        else:
+            encodings = np.asarray(embeddings[rows])
+        ids = [records[key]['id'] for key in keys]
+        names = [records[key]['name'] for key in keys]
+        return keys, ids, names, encodings
+
+    def find(self, id):
+        """
+        Look up a student by ID in O(1)
+
+        Returns:
+            tuple: (idx, record dict), or (None, None) if the ID is unknown
+        """
+        _, records, idx_of_id = self._index()
+        idx = idx_of_id.get(str(id))
+        if idx is None:
+            return None, None
+        return idx, dict(records[idx])
+
+    def thumbnail(self, thumb):
+        """Decode a stored thumbnail into a read-only RGB image, or None if missing"""
+        if not thumb:
+            return None
+        with self._thumbs_lock:
+            image = self._thumbs.get(thumb)
+            if image is not None:
+                self._thumbs.move_to_end(thumb)
+                return image
+
+        image = cv2.imread(os.path.join(self.thumbs_dir, thumb), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        image.flags.writeable = False
+        with self._thumbs_lock:
+            self._thumbs[thumb] = image
+            while len(self._thumbs) > self.thumb_cache_size:
+                self._thumbs.popitem(last=False)
+        return image
+
+    def _write_thumbnail(self, image):
+        thumb = uuid.uuid4().hex + '.jpg'
+        _atomic_write(os.path.join(self.thumbs_dir, thumb), encode_thumbnail(image))
+        return thumb
+
+    def _remove_thumbnail(self, thumb):
+        if thumb:
+            with self._thumbs_lock:
+                self._thumbs.pop(thumb, None)
+            try:
+                os.remove(os.path.join(self.thumbs_dir, thumb))
+            except OSError:
+                pass
+
+    def _append(self, conn, encoding):
+        """Append one encoding to the log (caller holds the write lock)"""
+        gen = int(self._get_meta(conn, 'gen', 0))
+        record_size = ENCODING_DIM * 4
+        data = np.asarray(encoding, dtype=np.float32).reshape(ENCODING_DIM).tobytes()
+
+        with open(self._log_path(gen), 'ab') as f:
+            # Drop a torn record left behind by a crash mid-append
+            log_rows = f.tell() // record_size
+            if f.tell() != log_rows * record_size:
+                f.truncate(log_rows * record_size)
+                f.seek(log_rows * record_size)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return self._snapshot_rows(gen) + log_rows
+
+    def _allocate_index(self, conn):
+        """Next never-used student index (caller holds the write lock)"""
+        max_idx = conn.execute("SELECT COALESCE(MAX(idx) + 1, 0) FROM students").fetchone()[0]
+        idx = max(int(self._get_meta(conn, 'next_idx', 0)), max_idx)
+        self._set_meta(conn, 'next_idx', idx + 1)
+        return idx
+
+    def next_index(self):
+        """First index never handed out, for callers numbering students in bulk"""
+        with closing(self._connect()) as conn:
+            max_idx = conn.execute("SELECT COALESCE(MAX(idx) + 1, 0) FROM students").fetchone()[0]
+            return max(int(self._get_meta(conn, 'next_idx', 0)), max_idx)
+
+    def add(self, id, name, encoding, image):
+        """
+        Enroll a new student under a freshly allocated index
+
+        Indexes are never reused, even after deletes.
+
+        Args:
+            id (str): Student ID
+            name (str): Student name
+            encoding (array-like): 128-d face encoding
+            image (np.ndarray): RGB enrollment photo
+
+        Returns:
+            int: The new index, or None if the ID is already enrolled
+        """
+        thumb = self._write_thumbnail(image)
+        with self._write() as (conn, cache):
+            if conn.execute("SELECT 1 FROM students WHERE id = ?", (str(id),)).fetchone():
+                idx = None
+            else:
+                idx = self._allocate_index(conn)
+                row = self._append(conn, encoding)
+                conn.execute(
+                    "INSERT INTO students (idx, id, name, row, thumb, file) VALUES (?, ?, ?, ?, ?, NULL)",
+                    (idx, str(id), name, row, thumb),
+                )
+                self._cache_put(cache, idx, {'id': str(id), 'name': name, 'row': row, 'thumb': thumb, 'file': None})
+
+        if idx is None:
+            self._remove_thumbnail(thumb)
+        else:
+            self.maybe_compact()
+        return idx
+
+    def put(self, idx, id, name, encoding, image):
+        """
+        Add or replace the student stored under an index
+
+        Args:
+            idx (int): Student index
+            id (str): Student ID
+            name (str): Student name
+            encoding (array-like): 128-d face encoding
+            image (np.ndarray): RGB enrollment photo
+
+        Returns:
+            bool: False if the ID already belongs to another student
+        """
+        thumb = self._write_thumbnail(image)
+        with self._write() as (conn, cache):
+            taken = conn.execute("SELECT 1 FROM students WHERE id = ? AND idx != ?", (str(id), idx)).fetchone()
+            if not taken:
+                old = conn.execute("SELECT thumb FROM students WHERE idx = ?", (idx,)).fetchone()
+                row = self._append(conn, encoding)
+                conn.execute(
+                    "INSERT OR REPLACE INTO students (idx, id, name, row, thumb, file) VALUES (?, ?, ?, ?, ?, NULL)",
+                    (idx, str(id), name, row, thumb),
+                )
+                if int(self._get_meta(conn, 'next_idx', 0)) <= idx:
+                    self._set_meta(conn, 'next_idx', idx + 1)
+                self._cache_put(cache, idx, {'id': str(id), 'name': name, 'row': row, 'thumb': thumb, 'file': None})
+
+        if taken:
+            self._remove_thumbnail(thumb)
+            return False
+        if old is not None:
+            self._remove_thumbnail(old[0])
+        self.maybe_compact()
+        return True
+
+    def rename(self, idx, id, name):
+        """
+        Change the ID and name of an enrolled student, keeping their encoding and photo
+
+        Args:
+            idx (int): Student index
+            id (str): New student ID
+            name (str): New student name
+
+        Returns:
+            bool: False if the ID already belongs to another student or no
+                student is stored under the index
+        """
+        with self._write() as (conn, cache):
+            taken = conn.execute("SELECT 1 FROM students WHERE id = ? AND idx != ?", (str(id), idx)).fetchone()
+            current = conn.execute("SELECT row, thumb, file FROM students WHERE idx = ?", (idx,)).fetchone()
+            if taken or current is None:
+                return False
+            conn.execute("UPDATE students SET id = ?, name = ? WHERE idx = ?", (str(id), name, idx))
+            row, thumb, file = current
+            self._cache_put(cache, idx, {'id': str(id), 'name': name, 'row': row, 'thumb': thumb, 'file': file})
+        return True
+
+    def delete(self, id):
+        """
+        Delete a student by ID
+
+        Returns:
+            int: Index of the deleted student, or None if the ID is unknown
+        """
+        with self._write() as (conn, cache):
+            row = conn.execute("SELECT idx, thumb FROM students WHERE id = ? LIMIT 1", (str(id),)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM students WHERE idx = ?", (row[0],))
+                self._cache_remove(cache, row[0])
+
+        if row is None:
+            return None
+        self._remove_thumbnail(row[1])
+        self.maybe_compact()
+        return row[0]
+
+    def _switch_generation(self, conn, gen, encodings, rows):
+        """Write a new snapshot and point the metadata at it (caller holds the write lock)"""
+        _save_npy(self._snapshot_path(gen), encodings)
+        open(self._log_path(gen), 'wb').close()
+        conn.executemany("UPDATE students SET row = ? WHERE idx = ?", rows)
+        self._set_meta(conn, 'gen', gen)
+
+    def _cleanup(self, gen):
+        """Remove snapshot and log files older than the previous generation"""
+        for old in range(gen - 1):
+            for path in (self._snapshot_path(old), self._log_path(old)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def maybe_compact(self):
+        """Compact if the log or the number of dead rows has grown too large"""
+        gen, records, _ = self._index()
+        live = len(records)
+        log_rows = self._log_rows(gen)
+        total = self._snapshot_rows(gen) + log_rows
+        if log_rows >= self.compact_rows or total - live >= self.compact_rows:
+            self.compact()
+
+    def compact(self):
+        """Fold the log into a new snapshot holding only live rows"""
+        with self._write(invalidate=True) as (conn, _):
+            gen = int(self._get_meta(conn, 'gen', 0))
+            live = conn.execute("SELECT idx, row FROM students ORDER BY idx").fetchall()
+            embeddings = self._embeddings(gen)
+            encodings = embeddings[[row for _, row in live]] if live else np.empty((0, ENCODING_DIM))
+            self._switch_generation(conn, gen + 1, encodings, [(new_row, idx) for new_row, (idx, _) in enumerate(live)])
+        self._cleanup(gen + 1)
+
+    def write_all(self, database):
+        """
+        Replace the whole store with a database dict
+
+        Entries need 'id', 'name' and 'encoding', plus either an RGB 'image'
+        or the 'thumb' of a thumbnail already in this store. An optional
+        'file' records the dataset image the entry was built from.
+
+        Args:
+            database (dict): Mapping of idx -> entry
+        """
+        keys = list(database.keys())
+
+        rows = []
+        for row, key in enumerate(keys):
+            entry = database[key]
+            thumb = entry.get('thumb')
+            if thumb is None and entry.get('image') is not None:
+                thumb = self._write_thumbnail(entry['image'])
+            rows.append((key, str(entry['id']), entry['name'], row, thumb, entry.get('file')))
+        encodings = np.array([database[key]['encoding'] for key in keys], dtype=np.float32)
+
+        with self._write(invalidate=True) as (conn, _):
+            old_thumbs = {thumb for (thumb,) in conn.execute("SELECT thumb FROM students")}
+            gen = int(self._get_meta(conn, 'gen', 0)) + 1
+            conn.execute("DELETE FROM students")
+            conn.executemany(
+                "INSERT INTO students (idx, id, name, row, thumb, file) VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._switch_generation(conn, gen, encodings, [])
+            next_idx = max(int(self._get_meta(conn, 'next_idx', 0)), max(keys, default=-1) + 1)
+            self._set_meta(conn, 'next_idx', next_idx)
+
+        self._cleanup(gen)
+        for thumb in old_thumbs - {row[4] for row in rows}:
+            self._remove_thumbnail(thumb)
+
+    def file_entries(self):
+        """
+        Entries built from dataset files, for incremental dataset rebuilds
+
+        Returns:
+            dict: idx -> {'id', 'name', 'encoding', 'thumb', 'file'}
+        """
+        gen, records, _ = self._index()
+        embeddings = self._embeddings(gen)
+        return {
+            idx: {
+                'id': record['id'],
+                'name': record['name'],
+                'encoding': np.array(embeddings[record['row']]),
+                'thumb': record['thumb'],
+                'file': record['file'],
+            }
+            for idx, record in records.items()
+            if record['file']
+        }
+
+
+# Process-wide stores, so their in-memory indexes survive Streamlit reruns
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(root, **params):
+    """
+    Get the shared store for a directory, opening it on first use
+
+    Args:
+        root (str): Directory holding the store files
+        **params: EnrollmentStore options used when the store is first opened
+
+    Returns:
+        EnrollmentStore: The process-wide store for ``root``
+    """
+    key = os.path.abspath(root)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = EnrollmentStore(root, **params)
+        return _stores[key]
+
+
+def migrate_pickle(pkl_path, store):
+    """
+    One-shot import of a legacy ``database.pkl`` into a store
+
+    Args:
+        pkl_path (str): Path of the pickled database dict
+        store (EnrollmentStore): Destination store
+
+    Returns:
+        int: Number of migrated students
+    """
+    with open(pkl_path, 'rb') as f:
+        database = pickle.load(f)
+    store.write_all(database)
+    with store._write() as (conn, _):
+        store._set_meta(conn, 'migrated', pkl_path)
+    return len(database)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate a legacy database.pkl into an enrollment store")
+    parser.add_argument('pkl_path', help="Path of the legacy pickle database")
+    parser.add_argument('store_dir', help="Directory of the new store")
+    args = parser.parse_args()
+
+    count = migrate_pickle(args.pkl_path, EnrollmentStore(args.store_dir))
+    print(f"Migrated {count} students into {args.store_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+import threading
+
+import cv2
+import numpy as np
+
+
+def iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return inter / float(area_a + area_b - inter)
+
+
+class Track:
+    """One face followed across frames, with its cached identity"""
+
+    def __init__(self, track_id, box, identity, template):
+        self.track_id = track_id
+        self.box = box
+        self.identity = identity
+        self.template = template
+        self.missed = 0
+
+
+class FaceTracker:
+    """
+    Track-then-recognize layer in front of face detection and encoding
+
+    Full detection runs every ``detect_every`` frames, or sooner when a track
+    is lost or the gallery changes. Detections are associated
+    with existing tracks by IoU and only unmatched (new) faces are encoded;
+    matched tracks keep their cached identity. In between, each box is moved
+    by template matching its last face patch inside a small search window.
+
+    Args:
+        detect_every (int): Frames between full detections
+        iou_threshold (float): Minimum IoU to associate a detection with a track
+        max_missed (int): Detections a track may miss before it is dropped
+        min_score (float): Minimum template match score to keep a box
+        retry_unknown (bool): Re-encode tracks still unknown at each detection
+    """
+
+    def __init__(self, detect_every=10, iou_threshold=0.3, max_missed=2,
+                 min_score=0.5, retry_unknown=True):
+        self.detect_every = max(1, int(detect_every))
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.min_score = min_score
+        self.retry_unknown = retry_unknown
+        self.tracks = []
+        self.stats = {'frames': 0, 'detections': 0, 'encoded': 0}
+
+        self._next_id = 0
+        self._since_detect = 0
+        self._force_detect = True
+        self._gallery = None
+        self._lock = threading.Lock()
+
+    def update(self, image, detect, identify, reencode=None, gallery=None):
+        """
+        Advance the tracker by one frame
+
+        Args:
+            image (np.ndarray): Current frame
+            detect (callable): detect(image) -> list of face boxes
+            identify (callable): identify(image, boxes) -> one identity tuple per box
+            reencode (callable): reencode(identity) -> True to encode a matched,
+                already identified track again at this frame's detection
+            gallery: Gallery the identities are matched against; tracks are
+                forgotten when a different one is passed, since their cached
+                identities may name renamed or removed students
+
+        Returns:
+            list: One (box, *identity) tuple per tracked face
+        """
+        with self._lock:
+            if gallery is not None and gallery is not self._gallery:
+                if self._gallery is not None:
+                    self.tracks = []
+                    self._force_detect = True
+                self._gallery = gallery
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+            self.stats['frames'] += 1
+
+            if self._force_detect or self._since_detect >= self.detect_every:
+                self._detect(image, gray, detect, identify, reencode)
+            else:
+                self._propagate(gray)
+
+            return [(track.box,) + tuple(track.identity) for track in self.tracks]
+
+    def _detect(self, image, gray, detect, identify, reencode=None):
+        self.stats['detections'] += 1
+        self._since_detect = 0
+        self._force_detect = False
+
+        boxes = list(detect(image))
+        pairs = sorted(
+            ((iou(track.box, box), t, d) for t, track in enumerate(self.tracks) for d, box in enumerate(boxes)),
+            reverse=True,
+        )
+
+        # Greedy IoU association, best overlaps first
+        matched_tracks, matched_boxes = set(), set()
+        for score, t, d in pairs:
+            if score < self.iou_threshold:
+                break
+            if t in matched_tracks or d in matched_boxes:
+                continue
+            matched_tracks.add(t)
+            matched_boxes.add(d)
+            track = self.tracks[t]
+            track.box = boxes[d]
+            track.template = _crop(gray, track.box)
+            track.missed = 0
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        retry = [
+            track for track in self.tracks if track.missed == 0 and (
+                (self.retry_unknown and track.identity[0] == 'Unknown')
+                or (reencode is not None and track.identity[0] != 'Unknown' and reencode(track.identity))
+            )
+        ]
+        new_boxes = [box for d, box in enumerate(boxes) if d not in matched_boxes]
+
+        to_encode = [track.box for track in retry] + new_boxes
+        if not to_encode:
+            return
+        identities = identify(image, to_encode)
+        self.stats['encoded'] += len(to_encode)
+
+        for track, identity in zip(retry, identities):
+            track.identity = identity
+        for box, identity in zip(new_boxes, identities[len(retry):]):
+            self.tracks.append(Track(self._next_id, box, identity, _crop(gray, box)))
+            self._next_id += 1
+
+    def _propagate(self, gray):
+        self._since_detect += 1
+        for track in self.tracks:
+            box, score = _follow(gray, track.box, track.template)
+            if score < self.min_score:
+                # Lost the face; re-detect on the next frame
+                self._force_detect = True
+                continue
+            track.box = box
+            track.template = _crop(gray, box)
+
+
+def _crop(gray, box):
+    top, right, bottom, left = box
+    return gray[max(top, 0):max(bottom, 0), max(left, 0):max(right, 0)].copy()
+
+
+def _follow(gray, box, template, margin=0.5):
+    """Find a face template inside a window around its last box"""
+    top, right, bottom, left = box
+    h, w = template.shape[:2]
+    if h == 0 or w == 0:
+        return box, 0.0
+
+    dy, dx = int(h * margin), int(w * margin)
+    y0, x0 = max(top - dy, 0), max(left - dx, 0)
+    y1, x1 = min(bottom + dy, gray.shape[0]), min(right + dx, gray.shape[1])
+    window = gray[y0:y1, x0:x1]
+    if window.shape[0] < h or window.shape[1] < w:
+        return box, 0.0
+
+    scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+    _, score, _, (x, y) = cv2.minMaxLoc(scores)
+    if not np.isfinite(score):
+        return box, 0.0
+    top, left = y0 + y, x0 + x
+    return (top, left + w, top + h, left), float(score)
@@ -0,0 +1,231 @@
+import argparse
+import datetime
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+import yaml
+
+from utils.detection import FaceDetector
+from utils.multicam import SharedGallery, attach_gallery
+from utils.search import search_config
+
+# Grayscale size frames are compared at when looking for scene changes
+DIFF_SIZE = (64, 36)
+
+
+def sample_frames(path, check_interval=0.2, diff_threshold=8.0, max_gap=5.0):
+    """
+    Stream the frames of a video worth recognizing
+
+    Frames are read one at a time, never the whole file. Every
+    ``check_interval`` seconds of video a frame is decoded and compared with
+    the last sampled one on a tiny grayscale copy; it is sampled when the
+    mean absolute difference exceeds ``diff_threshold`` (people moved, the
+    camera cut) or when ``max_gap`` seconds have passed without a sample.
+    Frames in between are skipped without being converted.
+
+    Args:
+        path (str): Video file
+        check_interval (float): Seconds of video between compared frames
+        diff_threshold (float): Mean absolute grayscale difference (0-255) that counts as a change
+        max_gap (float): Longest stretch of video without a sample, in seconds
+
+    Yields:
+        tuple: (frame number, offset in seconds, BGR frame)
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    stride = max(1, int(round(fps * check_interval)))
+
+    last_small, last_offset = None, None
+    frame_no = -1
+    try:
+        while True:
+            frame_no += 1
+            if frame_no % stride:
+                if not cap.grab():
+                    break
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            offset = frame_no / fps
+            small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), DIFF_SIZE, interpolation=cv2.INTER_AREA)
+            if (last_small is not None
+                    and offset - last_offset < max_gap
+                    and cv2.absdiff(small, last_small).mean() < diff_threshold):
+                continue
+            last_small, last_offset = small, offset
+            yield frame_no, offset, frame
+    finally:
+        cap.release()
+
+
+# Per-process state of the recognition pool
+_worker = None
+
+
+def _init_worker(handle, options):
+    global _worker
+
+    import face_recognition as frg
+
+    cv2.setNumThreads(1)
+    gallery, shm = attach_gallery(handle, options['backend'], **options['search'])
+    _worker = (frg, FaceDetector(**options['detection']), gallery, shm, options['tolerance'])
+
+
+def _recognize_frame(offset, frame):
+    """Recognize the faces of one sampled frame (runs in a worker process)"""
+    frg, detector, gallery, _, tolerance = _worker
+    image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    boxes = detector.detect(image)
+    if not boxes or not len(gallery):
+        return offset, len(boxes), []
+    faces = []
+    for row, distance in gallery.match(frg.face_encodings(image, boxes), tolerance):
+        if row >= 0:
+            faces.append((gallery.ids[row], gallery.names[row], float(distance)))
+    return offset, len(boxes), faces
+
+
+def process_video(path, load, tolerance=0.5, workers=None, backend='exact', search_params=None,
+                  detection=None, check_interval=0.2, diff_threshold=8.0, max_gap=5.0, progress=None):
+    """
+    Build a first-seen/last-seen timeline of every student in a recorded video
+
+    Sampled frames are recognized by a process pool sharing one copy of the
+    gallery; at most two frames per worker are in flight, so memory stays
+    flat however long the video is.
+
+    Args:
+        path (str): Video file
+        load (callable): Returns (keys, ids, names, encodings) for the gallery
+        tolerance (float): Largest match distance accepted
+        workers (int): Worker processes (default: one per core)
+        backend (str): Search backend, see utils.search.make_index
+        search_params (dict): Search backend options
+        detection (dict): FaceDetector arguments
+        check_interval (float): See sample_frames
+        diff_threshold (float): See sample_frames
+        max_gap (float): See sample_frames
+        progress (callable): Called with the offset in seconds of each finished frame
+
+    Returns:
+        tuple: (timeline, stats) where timeline maps student ID to
+            {'name', 'first_seen', 'last_seen', 'sightings'} (offsets in
+            seconds) and stats has frame counts, video length and wall time
+    """
+    workers = workers or os.cpu_count() or 1
+    options = {
+        'tolerance': tolerance,
+        'backend': backend,
+        'search': search_params or {},
+        'detection': detection or {},
+    }
+    cap = cv2.VideoCapture(path)
+    frames, fps = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+
+    gallery = SharedGallery(*load())
+    start = time.perf_counter()
+    timeline = {}
+    stats = {'frames': frames, 'sampled': 0, 'faces': 0, 'video_seconds': round(frames / fps, 1)}
+
+    def collect(done):
+        for future in done:
+            offset, detected, faces = future.result()
+            stats['faces'] += detected
+            for student_id, name, _ in faces:
+                entry = timeline.setdefault(student_id, {
+                    'name': name, 'first_seen': offset, 'last_seen': offset, 'sightings': 0,
+                })
+                entry['first_seen'] = min(entry['first_seen'], offset)
+                entry['last_seen'] = max(entry['last_seen'], offset)
+                entry['sightings'] += 1
+            if progress is not None:
+                progress(offset)
+
+    try:
+        # Spawned, not forked: the app calls this from a multithreaded process
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(gallery.handle, options)) as pool:
+            pending = set()
+            for frame_no, offset, frame in sample_frames(path, check_interval, diff_threshold, max_gap):
+                stats['sampled'] += 1
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(pool.submit(_recognize_frame, offset, frame))
+            collect(wait(pending).done)
+    finally:
+        gallery.close()
+
+    stats['wall_seconds'] = round(time.perf_counter() - start, 2)
+    stats['speedup'] = round(stats['video_seconds'] / max(stats['wall_seconds'], 1e-9), 1)
+    return timeline, stats
+
+
+def main():
+    from utils.attendance import record_timeline
+    from utils.store import open_store
+
+    parser = argparse.ArgumentParser(description="Take attendance from a recorded lecture")
+    parser.add_argument('video', help="Video file")
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--start', default=None,
+                        help="Wall-clock start of the recording, YYYY-MM-DD HH:MM:SS (default: file modification time)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-mark', action='store_true', help="Print the timeline without marking attendance")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        cfg = yaml.load(f, Loader=yaml.FullLoader) or {}
+    video = cfg.get('VIDEO') or {}
+    search = cfg.get('SEARCH') or {}
+    detection = cfg.get('DETECTION') or {}
+    dataset_dir = cfg.get('PATH', {}).get('DATASET_DIR', 'dataset/')
+    store = open_store(cfg.get('PATH', {}).get('STORE_DIR', os.path.join(dataset_dir, 'store')))
+
+    backend, search_params = search_config(search)
+    timeline, stats = process_video(
+        args.video,
+        store.gallery_arrays,
+        tolerance=(cfg.get('RECOGNITION') or {}).get('DEFAULT_TOLERANCE', 0.5),
+        workers=args.workers or video.get('WORKERS'),
+        backend=backend,
+        search_params=search_params,
+        detection={
+            'scale': detection.get('SCALE', 1.0),
+            'upsample': detection.get('UPSAMPLE', 1),
+            'model': detection.get('MODEL', 'hog'),
+            'min_face_size': detection.get('MIN_FACE_SIZE', 0),
+        },
+        check_interval=video.get('CHECK_INTERVAL', 0.2),
+        diff_threshold=video.get('DIFF_THRESHOLD', 8.0),
+        max_gap=video.get('MAX_GAP', 5.0),
+    )
+
+    for student_id, entry in sorted(timeline.items(), key=lambda item: item[1]['first_seen']):
+        print(f"{student_id:>10}  {entry['name']:<30} {entry['first_seen']:8.1f}s - {entry['last_seen']:8.1f}s "
+              f"({entry['sightings']} sightings)")
+    print(f"{stats['sampled']} of {stats['frames']} frames recognized, {stats['video_seconds']:.0f}s of video "
+          f"in {stats['wall_seconds']}s ({stats['speedup']}x real time)")
+
+    if not args.no_mark:
+        if args.start:
+            started_at = datetime.datetime.strptime(args.start, "%Y-%m-%d %H:%M:%S")
+        else:
+            started_at = datetime.datetime.fromtimestamp(os.path.getmtime(args.video))
+        lecture = os.path.splitext(os.path.basename(args.video))[0]
+        print(f"Timeline saved to {record_timeline(timeline, lecture, started_at)}")
+
+
+if __name__ == '__main__':
+    main()
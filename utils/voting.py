@@ -0,0 +1,84 @@
+import collections
+import datetime
+import threading
+
+
+class VoteAggregator:
+    """
+    Turns per-frame matches into one attendance event per student per session
+
+    Every observed frame casts one vote for each student recognized in it.
+    A student is confirmed once they collect ``min_votes`` votes within the
+    last ``window`` frames of the same source, so a single-frame false match
+    never marks anyone. The sink is called exactly once per confirmed student
+    over the life of the aggregator, so each capture session starts a new
+    one. Only frames that ran detection should be
+    observed, with only the faces encoded in them: identities reused from a
+    tracker or a motion-gated frame would repeat earlier votes.
+
+    Args:
+        window (int): Frames in the sliding window, per source
+        min_votes (int): Votes within the window needed to confirm a student
+        sink (callable): Called with (student_id, student_name) on confirmation,
+            e.g. AttendanceWriter.mark
+    """
+
+    def __init__(self, window=10, min_votes=5, sink=None):
+        self.window = max(1, int(window))
+        self.min_votes = max(1, min(int(min_votes), self.window))
+        self.sink = sink
+        self.confirmed = {}
+        self._frames = {}
+        self._votes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, faces, source=None):
+        """
+        Count the votes of one frame
+
+        Args:
+            faces (list): (student_id, student_name, distance) per recognized
+                face; unknown faces are ignored
+            source (str): Camera the frame came from
+
+        Returns:
+            list: (student_id, student_name, mean distance) of the students
+                confirmed by this frame
+        """
+        best = {}
+        for student_id, student_name, distance in faces:
+            if student_id in (None, 'Unknown'):
+                continue
+            if student_id not in best or distance < best[student_id][1]:
+                best[student_id] = (student_name, distance)
+
+        confirmed = []
+        with self._lock:
+            frames = self._frames.setdefault(source, collections.deque())
+            votes = self._votes.setdefault(source, {})
+            frames.append(best)
+            if len(frames) > self.window:
+                for student_id, (_, distance) in frames.popleft().items():
+                    count, total = votes[student_id]
+                    if count == 1:
+                        del votes[student_id]
+                    else:
+                        votes[student_id] = (count - 1, total - distance)
+
+            for student_id, (student_name, distance) in best.items():
+                count, total = votes.get(student_id, (0, 0.0))
+                votes[student_id] = (count + 1, total + distance)
+                if count + 1 >= self.min_votes and student_id not in self.confirmed:
+                    mean = (total + distance) / (count + 1)
+                    self.confirmed[student_id] = {
+                        'name': student_name,
+                        'time': datetime.datetime.now().strftime("%H:%M:%S"),
+                        'source': source,
+                        'distance': round(float(mean), 3),
+                    }
+                    confirmed.append((student_id, student_name, float(mean)))
+
+        if self.sink is not None:
+            for student_id, student_name, _ in confirmed:
+                self.sink(student_id, student_name)
+        return confirmed